@@ -8,16 +8,29 @@ import json
 import time
 import logging
 import asyncio
+import gc
+import hashlib
+import os
 import subprocess
 import sys
+import queue
+import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Tuple
-import base64
+from typing import Callable, Deque, Dict, List, Optional, Any, Tuple
 import io
+import itertools
 import re
+from dataclasses import dataclass, replace
+from collections import deque
+from functools import cached_property
+from itertools import islice
+from operator import itemgetter
 
-from ui_detection_improved import DetectionResult, StartButtonDetector
+from ui_detection_improved import DetectionResult, GenericUIDetector, StartButtonDetector, decode_base64_to_cv2, pil_to_cv2
+import win_input
 
 # Import task templates
 try:
@@ -37,6 +50,9 @@ except ImportError:
     subprocess.run([sys.executable, "-m", "pip", "install", "requests"], check=True)
     import requests
 
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 try:
     from PIL import ImageGrab, Image
 except ImportError:
@@ -53,21 +69,222 @@ except ImportError:
     subprocess.run([sys.executable, "-m", "pip", "install", "pyautogui"], check=True)
     import pyautogui
 
+try:
+    import psutil  # Optional: RSS readings that gate garbage collection after tasks
+except ImportError:
+    psutil = None
+
+try:
+    import httpx  # Optional: enables the async Ollama client methods
+except ImportError:
+    httpx = None
+
+try:
+    import pybase64 as base64  # Optional: SIMD base64 for large screenshot payloads
+except ImportError:
+    import base64
+
+try:
+    import orjson  # Optional: faster encoding/parsing of Ollama requests and responses
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+    
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+# Request bodies are pre-encoded with _json_dumps, so the type is set by hand
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
 # Disable PyAutoGUI fail-safe for controlled automation
 pyautogui.FAILSAFE = False
+# No implicit 0.1s pause after every PyAutoGUI call; the agent loop waits for
+# the screen to settle after each action instead
+pyautogui.PAUSE = 0
+
+_JSON_DECODER = json.JSONDecoder()
+# Python literals and trailing commas that small models leak into "JSON";
+# strings are matched first so their contents are left untouched
+_JSON_REPAIR_RE = re.compile(r'"(?:\\.|[^"\\])*"|\b(True|False|None)\b|,(\s*[}\]])')
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+# "action": "<name>" inside a partially streamed plan
+_ACTION_FIELD_RE = re.compile(r'"action"\s*:\s*"([^"\\]*)"')
+# "element_name": "<query>" of a detect_ui_element plan that is still streaming
+_ELEMENT_NAME_RE = re.compile(r'"element_name"\s*:\s*"([^"\\]*)"')
+# Observations that mean the model needs a full-size frame next step
+_DETAIL_HINT_RE = re.compile(r'\b(?:zoom|read|small text|tiny|blurry)', re.IGNORECASE)
+# A whole plan inside a ```json fence, the usual shape of a complete response
+_JSON_FENCE_RE = re.compile(r'```(?:json)?\s*(\{.*?\})\s*```', re.DOTALL)
+
+# Per-step head of the agent prompt; formatted every step
+_AGENT_STEP_PROMPT = """TASK: {enhanced_task}
+Step {step}/{max_steps} | Screen Resolution: {screen_size} | Screenshot: {image_size} (give x/y in screenshot pixels)
+{context_summary}
+NOW: Look at the image, analyze the situation, think about the best approach, then respond with your thinking + JSON.
+"""
+
+# Prepended to the step head when the image is left out of a request
+_UNCHANGED_SCREEN_NOTE = """NOTE: The screen has not changed since your last look, so no screenshot is attached.
+What you observed then: {observation}
+
+"""
+
+# Actions after which an unchanged frame means something did not react, so
+# the model must look at the pixels again rather than rely on its last note
+_NAVIGATION_ACTIONS = frozenset({
+    "mouse_click", "double_click", "right_click", "mouse_move", "scroll",
+    "keyboard_type", "key_press", "hotkey", "open_app", "escape",
+    "ctrl_n", "select_all", "save_file", "alt_tab", "chain",
+})
+
+# Actions that may change what is on screen. "wait" is included on purpose:
+# the model waits precisely so a page or dialog can finish drawing.
+_SCREEN_ACTIONS = _NAVIGATION_ACTIONS | {"detect_ui_element", "wait"}
+
+# Static instructions, sent as the Ollama "system" field so they form an
+# unchanging prefix the server can keep in its KV cache across steps. Only
+# {screen_size} varies, so this is formatted once per session.
+_AGENT_INSTRUCTIONS_TEMPLATE = """ANALYZE THE SCREENSHOT:
+Look carefully at what's on screen. Describe what you see, then decide the next action.
+
+You can THINK OUT LOUD, but your final response MUST end with valid JSON in this format:
+
+THINKING: [Describe what you see and your reasoning]
+
+```json
+{{
+    "observation": "what I see on screen",
+    "action": "action_name",
+    "reasoning": "why this action",
+    "parameters": {{}},
+    "task_complete": false
+}}
+```
+
+AVAILABLE ACTIONS (prefer mouse-based interaction):
+
+**PRIMARY ACTIONS** (use these for navigation):
+- detect_ui_element: {{"element_name": "Start button"}} - **PREFERRED**: Auto-detect UI element and get EXACT coordinates
+- mouse_move: {{"x": 100, "y": 200}} - Move mouse to specific coordinates (use before clicking)
+- mouse_click: {{"x": 100, "y": 200, "button": "left"}} - Click at coordinates (left/right/middle)
+- double_click: {{"x": 100, "y": 200}} - Double-click at coordinates (opens files/folders)
+- right_click: {{"x": 100, "y": 200}} - Right-click for context menus
+
+**INTERACTION ACTIONS**:
+- keyboard_type: {{"text": "your text here"}} - Type text in focused window
+- key_press: {{"key": "enter"}} - Press single key (enter, tab, escape, space, etc.)
+- hotkey: {{"keys": ["ctrl", "c"]}} - Press key combinations (ctrl+c, alt+tab, win+r, etc.)
+- scroll: {{"amount": 3}} - Scroll mouse wheel (positive=down, negative=up)
+- chain: {{"steps": [{{"action": "hotkey", "parameters": {{"keys": ["win", "r"]}}}}, {{"action": "keyboard_type", "parameters": {{"text": "notepad"}}}}, {{"action": "key_press", "parameters": {{"key": "enter"}}}}]}}
+  Run several of the actions above back to back in ONE step (no screenshot in between). Use it when
+  you are sure of the whole sequence, e.g. open a dialog -> type -> confirm. Not for detect_ui_element/wait/complete.
+
+**UTILITY ACTIONS**:
+- wait: {{"seconds": 2}} - Wait for UI to respond/load
+- complete: {{}} - Mark task as finished
+
+**DISCOURAGED** (only use if mouse navigation impossible):
+- open_app: {{"app": "appname"}} - Launch application via command line
+
+**💡 TIP: Use detect_ui_element FIRST before manual coordinate guessing!**
+Example: detect_ui_element with "Start button", "Calculator icon", "Close button", etc.
+This gives you EXACT pixel coordinates automatically!
+
+**COORDINATES**:
+Screen dimensions: {screen_size} pixels. The screenshot may be scaled down; its size is given
+every step. Give x/y in SCREENSHOT pixels, (0, 0) is the top-left corner - they are scaled to the screen for you.
+- Estimate positions visually (think of a 10x10 grid) and ALWAYS target the CENTER of an element
+- Start button: bottom-left corner; taskbar: bottom row; system tray/clock: bottom-right
+- Window close (X) is at the top-right of its title bar, with maximize/minimize just left of it
+- If a click misses, adjust by 50-100 pixels toward the target and try again
+**DO NOT use hardcoded coordinates! ALWAYS estimate from visual analysis!**
+
+**WINDOW DETECTION**:
+- Scan the whole screen top to bottom; a visible title bar, menu or taskbar icon means that app IS OPEN
+- A partially covered window is still visible - never report "no window" because of overlap
+- Title bars show the app/document name (e.g. "Untitled - Notepad") with -, □, X on the right
+- Recognise apps by layout: editors (white text area, menu bar), calculators (number pad and display),
+  browsers (tabs and address bar), File Explorer (folder tree and file list), terminals (dark monospace text)
+
+**Task Execution Strategy**:
+1. **Understand the Goal**: Break down what needs to be achieved
+2. **Assess Current State**: What's already on screen? What's missing?
+3. **Plan Minimal Steps**: Use the FEWEST actions to complete the task
+4. **Adapt to Reality**: If something already exists, skip creating it
+5. **Verify Progress**: Check if each action had the expected effect
+
+**Smart Decision Making**:
+- **PREFER MOUSE OVER COMMANDS**: Instead of open_app, click Start menu and search
+- **Locate Visual Elements**: Find buttons, icons, links on screen and click them
+- **Use Taskbar**: Click taskbar icons to switch between open applications
+- **Estimate Coordinates**: Look at element positions and estimate x,y coordinates
+- **Focus Windows**: Click on a window's title bar or content area to focus it
+- **Navigate Naturally**: Use mouse like a human would - click buttons, links, icons
+- **Verify Clicks Work**: If a click doesn't work, try a different coordinate nearby
+- **Search for Apps**: Win+S or click Start → type app name → click result
+
+**EXAMPLES OF PROPER MOUSE NAVIGATION**:
+✅ "To open Notepad: mouse_click Start button (bottom-left corner of the screenshot) → keyboard_type 'notepad' → mouse_click first result"
+✅ "To focus window: mouse_click on its title bar or visible content area"
+✅ "To click button: estimate button center coordinates from visual inspection"
+❌ "To open Notepad: open_app notepad" - USE MOUSE INSTEAD!"""
+
 
 class OllamaClient:
     """Client for interacting with Ollama API"""
     
-    def __init__(self, base_url: str = "http://localhost:11434"):
+    def __init__(self, base_url: str = "http://localhost:11434", tags_ttl: float = 5.0):
         self.base_url = base_url
         self.available_models = []
+        self.tags_ttl = tags_ttl  # Seconds an /api/tags response is reused
+        self._tags_cache: Optional[Tuple[float, Dict]] = None  # (monotonic time, payload)
+        self._async_client = None  # Lazily created httpx.AsyncClient
+        
+        # Reuse keep-alive sockets to Ollama across every call
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=2, backoff_factor=0.2)
+        ))
+        self.session.headers.update({"Connection": "keep-alive", "Accept-Encoding": "gzip"})
+    
+    def close(self):
+        """Release pooled HTTP connections"""
+        self.session.close()
+        
+    def _fetch_tags(self) -> Optional[Dict]:
+        """Return the /api/tags payload, reusing a response younger than tags_ttl"""
+        cached = self._tags_cache
+        if cached and time.monotonic() - cached[0] < self.tags_ttl:
+            return cached[1]
+        
+        response = self.session.get(f"{self.base_url}/api/tags", timeout=5)
+        if response.status_code != 200:
+            return None
+        data = _json_loads(response.content)
+        self._tags_cache = (time.monotonic(), data)
+        return data
+    
+    def _post(self, path: str, payload: Dict, **kwargs) -> requests.Response:
+        """POST a JSON body to Ollama, encoding it with orjson when available
         
+        Step payloads carry megabytes of base64 image data; orjson serialises
+        them straight to bytes, skipping the str -> UTF-8 copy that
+        ``requests(json=...)`` makes after the stdlib encoder.
+        """
+        return self.session.post(f"{self.base_url}{path}", data=_json_dumps(payload), headers=_JSON_HEADERS, **kwargs)
+    
+    def invalidate_tags_cache(self):
+        """Force the next list_models/check_connection to hit Ollama"""
+        self._tags_cache = None
+    
     def check_connection(self) -> bool:
         """Check if Ollama is running"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            return response.status_code == 200
+            return self._fetch_tags() is not None
         except requests.exceptions.ConnectionError:
             # Ollama is not running
             return False
@@ -78,9 +295,8 @@ class OllamaClient:
     def list_models(self) -> List[str]:
         """Get list of available models"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            if response.status_code == 200:
-                data = response.json()
+            data = self._fetch_tags()
+            if data is not None:
                 self.available_models = [model['name'] for model in data.get('models', [])]
                 return self.available_models
             return []
@@ -88,39 +304,102 @@ class OllamaClient:
             logging.error(f"Failed to list models: {e}")
             return []
     
-    def generate(self, model: str, prompt: str, images: List[str] = None, stream: bool = False, keep_alive: str = "5m", timeout: int = 30) -> Dict:
-        """Generate response from Ollama model with memory control and cancellation support"""
-        try:
-            payload = {
-                "model": model,
-                "prompt": prompt,
-                "stream": stream,
-                "keep_alive": keep_alive,  # Control how long model stays in VRAM
-                "options": {
-                    "num_ctx": 4096,  # Reduced context window for better performance
-                    "num_gpu": 99,  # Force ALL layers to GPU (99 = use all available GPU layers)
-                    "num_thread": 2,  # Reduce CPU threads to prioritize GPU
-                    "numa": False  # Disable NUMA for single GPU systems
-                }
+    def _generate_payload(self, model: str, prompt: str, images: Optional[List[str]], keep_alive: str) -> Dict:
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": True,
+            "keep_alive": keep_alive,  # Control how long model stays in VRAM
+            "options": {
+                "num_ctx": 4096,  # Reduced context window for better performance
+                "num_gpu": 99,  # Force ALL layers to GPU (99 = use all available GPU layers)
+                "num_thread": 2,  # Reduce CPU threads to prioritize GPU
+                "numa": False  # Disable NUMA for single GPU systems
             }
-            
-            if images:
-                payload["images"] = images
+        }
+        if images:
+            payload["images"] = images
+        return payload
+    
+    def _chat_payload(self, model: str, messages: List[Dict], images: Optional[List[str]], keep_alive: str) -> Dict:
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            "keep_alive": keep_alive,  # Control memory usage
+            "options": {
+                "num_ctx": 4096,
+                "num_gpu": 99,  # Force ALL layers to GPU (99 = use all available GPU layers)
+                "num_thread": 2,  # Reduce CPU threads to prioritize GPU
+                "numa": False  # Disable NUMA for single GPU systems
+            }
+        }
+        if images:
+            payload["images"] = images
+        return payload
+    
+    @staticmethod
+    def _parse_chunk(line) -> Optional[Dict]:
+        """Decode one NDJSON line, returning None for blank or malformed lines"""
+        if not line:
+            return None
+        try:
+            return _json_loads(line)
+        except json.JSONDecodeError:  # orjson.JSONDecodeError subclasses this
+            logging.warning("Failed to parse streaming chunk: %s", line[:100])
+            return None
+    
+    def iter_stream(self, response) -> Any:
+        """Yield decoded NDJSON chunks from a streaming Ollama response.
+
+        ``iter_lines`` buffers partial lines internally, so a JSON object split
+        across TCP chunks is only decoded once its terminating newline arrives.
+        """
+        for line in response.iter_lines():
+            chunk = self._parse_chunk(line)
+            if chunk is None:
+                continue
+            yield chunk
+            if chunk.get('done', False):
+                break
+    
+    @staticmethod
+    def _vision_error(model: str, example: str) -> Dict:
+        return {"success": False, "error": f"Model '{model}' does not support vision (images). Please select a vision-capable model like 'llava' or '{example}'."}
+    
+    def generate(self, model: str, prompt: str, images: List[str] = None, stream: bool = False, keep_alive: str = "5m", timeout: int = 30, on_token: Optional[Callable[[str], None]] = None) -> Dict:
+        """Generate response from Ollama model with memory control and cancellation support
+        
+        The request is always streamed from Ollama and accumulated here, so the
+        first token arrives without waiting for the whole completion. Pass
+        ``stream=True`` to get the raw streaming response back instead, or
+        ``on_token`` to receive each token as it is decoded.
+        """
+        try:
+            payload = self._generate_payload(model, prompt, images, keep_alive)
             
             # Use shorter timeout for faster cancellation
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json=payload,
-                timeout=timeout  # Configurable timeout, default 30s
+            response = self._post(
+                "/api/generate",
+                payload,
+                timeout=timeout,  # Configurable timeout, default 30s
+                stream=True
             )
             
             if response.status_code == 200:
                 if stream:
                     return {"success": True, "response": response}
-                else:
-                    return {"success": True, "response": response.json().get('response', '')}
+                
+                parts = []
+                for chunk in self.iter_stream(response):
+                    token = chunk.get('response', '')
+                    if token:
+                        parts.append(token)
+                        if on_token:
+                            on_token(token)
+                return {"success": True, "response": "".join(parts)}
             elif response.status_code == 400 and images:
-                return {"success": False, "error": f"Model '{model}' does not support vision (images). Please select a vision-capable model like 'llava' or 'qwen3-vl'."}
+                return self._vision_error(model, "qwen3-vl")
             else:
                 return {"success": False, "error": f"HTTP {response.status_code}: {response.text}"}
                 
@@ -128,41 +407,42 @@ class OllamaClient:
             logging.error(f"Generation failed: {e}")
             return {"success": False, "error": str(e)}
     
-    def chat(self, model: str, messages: List[Dict], images: List[str] = None, keep_alive: str = "5m", timeout: int = 30) -> Dict:
-        """Chat with Ollama model with memory control and cancellation support"""
+    def chat(self, model: str, messages: List[Dict], images: List[str] = None, keep_alive: str = "5m", timeout: int = 30, on_token: Optional[Callable[[str], None]] = None) -> Dict:
+        """Chat with Ollama model with memory control and cancellation support
+        
+        Streams from Ollama and accumulates the message content; ``on_token``
+        is called with each content fragment as it arrives.
+        """
         try:
-            payload = {
-                "model": model,
-                "messages": messages,
-                "stream": False,
-                "keep_alive": keep_alive,  # Control memory usage
-                "options": {
-                    "num_ctx": 4096,
-                    "num_gpu": 99,  # Force ALL layers to GPU (99 = use all available GPU layers)
-                    "num_thread": 2,  # Reduce CPU threads to prioritize GPU
-                    "numa": False  # Disable NUMA for single GPU systems
-                }
-            }
-            
-            if images:
-                payload["images"] = images
+            payload = self._chat_payload(model, messages, images, keep_alive)
             
             # Use shorter timeout for faster cancellation
-            response = requests.post(
-                f"{self.base_url}/api/chat",
-                json=payload,
-                timeout=timeout  # Configurable timeout, default 30s
+            response = self._post(
+                "/api/chat",
+                payload,
+                timeout=timeout,  # Configurable timeout, default 30s
+                stream=True
             )
             
             if response.status_code == 200:
-                data = response.json()
+                parts = []
+                role = "assistant"
+                for chunk in self.iter_stream(response):
+                    message = chunk.get('message') or {}
+                    role = message.get('role', role)
+                    token = message.get('content', '')
+                    if token:
+                        parts.append(token)
+                        if on_token:
+                            on_token(token)
+                content = "".join(parts)
                 return {
                     "success": True,
-                    "message": data.get('message', {}),
-                    "response": data.get('message', {}).get('content', '')
+                    "message": {"role": role, "content": content},
+                    "response": content
                 }
             elif response.status_code == 400 and images:
-                return {"success": False, "error": f"Model '{model}' does not support vision (images). Please select a vision-capable model like 'llava' or 'qwen2-vl'."}
+                return self._vision_error(model, "qwen2-vl")
             else:
                 return {"success": False, "error": f"HTTP {response.status_code}: {response.text}"}
                 
@@ -170,13 +450,115 @@ class OllamaClient:
             logging.error(f"Chat failed: {e}")
             return {"success": False, "error": str(e)}
     
+    def open_generate(self, payload: Dict, timeout=30) -> requests.Response:
+        """POST a caller-built /api/generate payload and return the raw response
+        
+        For callers that need more than generate() exposes (a system prompt,
+        custom options, closing the connection mid-stream). The request is
+        streamed when ``payload["stream"]`` is true; read it with iter_stream().
+        """
+        return self._post("/api/generate", payload, timeout=timeout, stream=bool(payload.get("stream")))
+    
+    def chat_stream(self, model: str, messages: List[Dict], images: List[str] = None, keep_alive: str = "5m", timeout: int = 30):
+        """Yield chat content tokens as Ollama produces them
+        
+        Raises RuntimeError if Ollama rejects the request.
+        """
+        payload = self._chat_payload(model, messages, images, keep_alive)
+        response = self._post(
+            "/api/chat",
+            payload,
+            timeout=timeout,
+            stream=True
+        )
+        if response.status_code == 400 and images:
+            raise RuntimeError(self._vision_error(model, "qwen2-vl")["error"])
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text}")
+        
+        for chunk in self.iter_stream(response):
+            token = (chunk.get('message') or {}).get('content', '')
+            if token:
+                yield token
+    
+    def _get_async_client(self):
+        """Return the shared httpx.AsyncClient, creating it on first use"""
+        if httpx is None:
+            raise RuntimeError("httpx is not installed; async Ollama calls are unavailable")
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(30.0),
+                limits=httpx.Limits(max_connections=20)
+            )
+        return self._async_client
+    
+    async def _astream(self, path: str, payload: Dict, timeout: int, extract: Callable[[Dict], str], on_token: Optional[Callable[[str], None]]) -> Tuple[int, str]:
+        """POST a streaming request and accumulate tokens; returns (status, text)"""
+        client = self._get_async_client()
+        parts = []
+        async with client.stream("POST", path, content=_json_dumps(payload), headers=_JSON_HEADERS, timeout=timeout) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return response.status_code, response.text
+            async for line in response.aiter_lines():
+                chunk = self._parse_chunk(line)
+                if chunk is None:
+                    continue
+                token = extract(chunk)
+                if token:
+                    parts.append(token)
+                    if on_token:
+                        on_token(token)
+                if chunk.get('done', False):
+                    break
+        return 200, "".join(parts)
+    
+    async def agenerate(self, model: str, prompt: str, images: List[str] = None, keep_alive: str = "5m", timeout: int = 30, on_token: Optional[Callable[[str], None]] = None) -> Dict:
+        """Async variant of generate() so callers can overlap inference with capture/detection"""
+        try:
+            payload = self._generate_payload(model, prompt, images, keep_alive)
+            status, text = await self._astream("/api/generate", payload, timeout, lambda c: c.get('response', ''), on_token)
+            if status == 200:
+                return {"success": True, "response": text}
+            elif status == 400 and images:
+                return self._vision_error(model, "qwen3-vl")
+            return {"success": False, "error": f"HTTP {status}: {text}"}
+        except Exception as e:
+            logging.error("Async generation failed: %s", e)
+            return {"success": False, "error": str(e)}
+    
+    async def achat(self, model: str, messages: List[Dict], images: List[str] = None, keep_alive: str = "5m", timeout: int = 30, on_token: Optional[Callable[[str], None]] = None) -> Dict:
+        """Async variant of chat()"""
+        try:
+            payload = self._chat_payload(model, messages, images, keep_alive)
+            status, text = await self._astream("/api/chat", payload, timeout, lambda c: (c.get('message') or {}).get('content', ''), on_token)
+            if status == 200:
+                return {
+                    "success": True,
+                    "message": {"role": "assistant", "content": text},
+                    "response": text
+                }
+            elif status == 400 and images:
+                return self._vision_error(model, "qwen2-vl")
+            return {"success": False, "error": f"HTTP {status}: {text}"}
+        except Exception as e:
+            logging.error("Async chat failed: %s", e)
+            return {"success": False, "error": str(e)}
+    
+    async def aclose(self):
+        """Close the async HTTP client"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+    
     def unload_model(self, model: str) -> Dict:
         """Unload a model from VRAM/memory immediately"""
         try:
             logging.info(f"Unloading model: {model}")
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
+            response = self._post(
+                "/api/generate",
+                {
                     "model": model,
                     "keep_alive": 0  # Unload immediately
                 },
@@ -185,6 +567,7 @@ class OllamaClient:
             
             if response.status_code == 200:
                 logging.info(f"✓ Model {model} unloaded from memory")
+                self.invalidate_tags_cache()
                 return {"success": True}
             else:
                 return {"success": False, "error": f"HTTP {response.status_code}"}
@@ -193,56 +576,217 @@ class OllamaClient:
             return {"success": False, "error": str(e)}
 
 
+@dataclass
+class ScreenFrame:
+    """One encoded screenshot: image bytes on disk plus a lazily built base64 form"""
+    
+    path: Path
+    data: bytes
+    width: int
+    height: int
+    scale: Tuple[float, float] = (1.0, 1.0)  # (x, y) image pixels per screen pixel
+    source: Any = None  # Unscaled PIL grab, kept only when capture_frame(keep_source=True)
+    
+    @cached_property
+    def b64(self) -> str:
+        """Base64 payload for Ollama, only computed when a caller needs it"""
+        return base64.b64encode(self.data).decode('ascii')
+    
+    @cached_property
+    def digest(self) -> bytes:
+        """16-byte BLAKE2b of the encoded bytes; identifies the frame for dedup and caches"""
+        return hashlib.blake2b(self.data, digest_size=16).digest()
+
+
 class ScreenAnalyzer:
     """Handles screen capture and analysis"""
     
-    def __init__(self, screenshots_dir: Path, max_dimension: int = 1080):
+    # JPEG quality per colour mode; luma-only frames tolerate a lower setting
+    JPEG_QUALITY = {"RGB": 80, "L": 70}
+    
+    def __init__(self, screenshots_dir: Path, max_dimension: int = 1080, color_mode: str = "RGB"):
+        """
+        Args:
+            screenshots_dir: Where captured frames are written
+            max_dimension: Maximum width or height for optimization
+            color_mode: "RGB" (full colour JPEG), "L" (grayscale JPEG, ~1/3 the
+                bytes) or "P" (64-colour adaptive palette, lossless PNG)
+        """
+        if color_mode not in ("RGB", "L", "P"):
+            raise ValueError(f"Unsupported color_mode: {color_mode}")
         self.screenshots_dir = screenshots_dir
         self.screenshots_dir.mkdir(exist_ok=True)
         self.last_screenshot = None
         self.max_dimension = max_dimension  # Maximum width or height for optimization
+        self.color_mode = color_mode
+        # Encode buffer reused across frames; the lock guards it when
+        # acapture_frame encodes on worker threads
+        self._encode_buffer = io.BytesIO()
+        self._encode_lock = threading.Lock()
+        # Filenames: session start time + monotonic frame counter, so several
+        # captures within one second never overwrite each other
+        self._file_prefix = f"screen_{datetime.now().strftime('%Y%m%d_%H%M%S')}_"
+        self._frame_counter = itertools.count()
+        self.last_scale = (1.0, 1.0)  # (x, y) image pixels per screen pixel of last capture
+        self.last_grab_size: Optional[Tuple[int, int]] = None  # Unscaled size of the last capture
+        # Full-resolution grab behind the last fingerprint(), so a capture right
+        # after a change poll can encode it instead of grabbing again
+        self._latest_grab: Optional[Tuple[float, Any]] = None  # (monotonic time, PIL image)
+        self._grab_lock = threading.Lock()
         
     def capture_screen(self, region=None) -> Optional[str]:
         """Capture screen and return base64 encoded image (optimized for vision models)"""
+        frame = self.capture_frame(region)
+        return frame.b64 if frame else None
+    
+    def capture_frame(self, region=None, max_age: float = 0.0,
+                      max_dimension: Optional[int] = None, keep_source: bool = False) -> Optional[ScreenFrame]:
+        """Capture screen and return the encoded frame without forcing a base64 copy
+        
+        Callers that only need the file or raw JPEG bytes skip the 4/3x base64
+        expansion; ``frame.b64`` is built on first access. With ``max_age`` a
+        full-screen grab left by fingerprint() that is at most that many
+        seconds old is encoded instead of grabbing the screen again.
+        ``max_dimension`` overrides the analyzer's size limit for this frame;
+        ``keep_source`` keeps the unscaled grab on ``frame.source``.
+        """
         try:
-            if region:
-                screenshot = ImageGrab.grab(bbox=region)
-            else:
-                screenshot = ImageGrab.grab()
-            
-            # Get original dimensions
-            original_width, original_height = screenshot.size
-            logging.info(f"Screenshot captured: {original_width}x{original_height} (full resolution, no resizing)")
-            
-            # Save optimized screenshot
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filepath = self.screenshots_dir / f"screen_{timestamp}.jpg"
-            
-            # Save as JPEG with quality 85 for better compression
-            screenshot.save(filepath, format='JPEG', quality=85, optimize=True)
-            self.last_screenshot = filepath
-            
-            # Convert to base64 (use JPEG for smaller payload)
-            buffer = io.BytesIO()
-            screenshot.save(buffer, format='JPEG', quality=85, optimize=True)
-            buffer.seek(0)
-            img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            
-            # Clean up buffer
-            buffer.close()
-            del buffer
-            
-            logging.info(f"Screenshot size: {len(img_base64)} bytes")
-            
-            return img_base64
-            
+            screenshot = self._take_latest_grab(max_age) if region is None and max_age > 0 else None
+            if screenshot is None:
+                screenshot = self._grab(region)
+            return self._encode_frame(screenshot, max_dimension, keep_source)
         except Exception as e:
             logging.error(f"Screen capture failed: {e}")
             return None
-        finally:
-            # Force garbage collection
-            import gc
-            gc.collect()
+    
+    async def acapture_frame(self, region=None) -> Optional[ScreenFrame]:
+        """Async capture: grab on the calling thread, encode and write in a worker thread
+        
+        ImageGrab must run on the GUI thread on some platforms, but the resize,
+        JPEG encode and disk write can overlap with inference on the event loop.
+        """
+        try:
+            screenshot = self._grab(region)
+            return await asyncio.to_thread(self._encode_frame, screenshot)
+        except Exception as e:
+            logging.error("Screen capture failed: %s", e)
+            return None
+    
+    def fingerprint(self) -> Optional[bytes]:
+        """Cheap 8-byte digest of the current screen, for change detection only
+        
+        The grab is box-reduced 8x before hashing, so a poll costs one screen
+        grab and no encode.
+        """
+        try:
+            screenshot = self._grab()
+            small = screenshot.reduce(8)
+            digest = hashlib.blake2b(small.tobytes(), digest_size=8).digest()
+            small.close()
+            with self._grab_lock:
+                previous, self._latest_grab = self._latest_grab, (time.monotonic(), screenshot)
+            if previous:
+                previous[1].close()
+            return digest
+        except Exception as e:
+            logging.debug("Screen fingerprint failed: %s", e)
+            return None
+    
+    def _take_latest_grab(self, max_age: float):
+        """Hand over the grab kept by fingerprint() if it is recent enough"""
+        with self._grab_lock:
+            latest, self._latest_grab = self._latest_grab, None
+        if latest is None:
+            return None
+        taken_at, screenshot = latest
+        if time.monotonic() - taken_at > max_age:
+            screenshot.close()
+            return None
+        return screenshot
+    
+    def _grab(self, region=None):
+        if region:
+            return ImageGrab.grab(bbox=region)
+        return ImageGrab.grab()
+    
+    def _encode_frame(self, screenshot, max_dimension: Optional[int] = None, keep_source: bool = False) -> ScreenFrame:
+        """Resize, JPEG-encode and save a grabbed screenshot"""
+        # Downscale so the long edge fits max_dimension; dimensions are rounded
+        # down to a multiple of 28 (ViT patch size) to avoid server-side padding
+        original_width, original_height = screenshot.size
+        grabbed = screenshot
+        width, height = self._fit(screenshot.size, max_dimension)
+        if (width, height) != screenshot.size:
+            screenshot = screenshot.resize((width, height), Image.Resampling.LANCZOS)
+            if not keep_source:
+                grabbed.close()
+        scale = (width / original_width, height / original_height)
+        self.last_scale = scale
+        self.last_grab_size = (original_width, original_height)
+        logging.info("Screenshot captured: %dx%d -> %dx%d", original_width, original_height, width, height)
+        
+        # Save optimized screenshot
+        extension = "png" if self.color_mode == "P" else "jpg"
+        filepath = self.screenshots_dir / f"{self._file_prefix}{next(self._frame_counter):05d}.{extension}"
+        
+        # Encode once and reuse the bytes for disk and base64.
+        # optimize=True is skipped: its extra Huffman pass dominates encode time.
+        if self.color_mode == "P":
+            encoded = screenshot.convert("P", palette=Image.Palette.ADAPTIVE, colors=64)
+            image_format, options = 'PNG', {}
+        else:
+            encoded = screenshot if screenshot.mode == self.color_mode else screenshot.convert(self.color_mode)
+            image_format, options = 'JPEG', {"quality": self.JPEG_QUALITY[self.color_mode]}
+        with self._encode_lock:
+            buffer = self._encode_buffer
+            buffer.seek(0)
+            buffer.truncate()
+            encoded.save(buffer, format=image_format, **options)
+            data = buffer.getvalue()
+        filepath.write_bytes(data)
+        self.last_screenshot = filepath
+        
+        # Release pixel buffers now rather than waiting for a collection
+        if encoded is not screenshot:
+            encoded.close()
+        if not (keep_source and screenshot is grabbed):
+            screenshot.close()
+        
+        logging.info("Screenshot size: %d bytes (%s, %s)", len(data), extension.upper(), self.color_mode)
+        
+        return ScreenFrame(path=filepath, data=data, width=width, height=height, scale=scale,
+                           source=grabbed if keep_source else None)
+    
+    def _fit(self, size: Tuple[int, int], max_dimension: Optional[int] = None) -> Tuple[int, int]:
+        """Encoded size of a grab: long edge fitted to max_dimension, multiples of 28"""
+        max_dimension = max_dimension or self.max_dimension
+        original_width, original_height = size
+        longest = max(original_width, original_height)
+        if not max_dimension or longest <= max_dimension:
+            return size
+        ratio = max_dimension / longest
+        return (max(28, int(original_width * ratio) // 28 * 28),
+                max(28, int(original_height * ratio) // 28 * 28))
+    
+    def scale_for(self, max_dimension: Optional[int] = None) -> Tuple[float, float]:
+        """Scale the next full-screen frame will have with this size limit"""
+        size = self.last_grab_size
+        if size is None:
+            return self.last_scale
+        width, height = self._fit(size, max_dimension)
+        return (width / size[0], height / size[1])
+    
+    def to_screen_coords(self, x: float, y: float, scale: Optional[Tuple[float, float]] = None) -> Tuple[int, int]:
+        """Map pixel coordinates in a captured image back to screen coordinates
+        
+        ``scale`` is that frame's ScreenFrame.scale; the last capture's by default.
+        """
+        scale_x, scale_y = scale or self.last_scale
+        return (int(round(x / scale_x)), int(round(y / scale_y)))
+    
+    def to_image_coords(self, x: float, y: float, scale: Tuple[float, float]) -> Tuple[int, int]:
+        """Map screen coordinates into a frame captured at ``scale``"""
+        return (int(round(x * scale[0])), int(round(y * scale[1])))
     
     def get_screen_dimensions(self) -> Tuple[int, int]:
         """Get current screen dimensions"""
@@ -255,16 +799,24 @@ class ScreenAnalyzer:
     def cleanup_old_screenshots(self, keep_last: int = 10):
         """Delete old screenshots to prevent disk space buildup"""
         try:
-            screenshots = sorted(self.screenshots_dir.glob("screen_*.jpg"), key=lambda x: x.stat().st_mtime, reverse=True)
-            screenshots += sorted(self.screenshots_dir.glob("screen_*.png"), key=lambda x: x.stat().st_mtime, reverse=True)
+            # One directory pass; DirEntry.stat() reuses data from the listing on Windows
+            with os.scandir(self.screenshots_dir) as it:
+                screenshots = [
+                    (entry.stat().st_mtime, entry.path, entry.name)
+                    for entry in it
+                    if entry.name.startswith("screen_")
+                    and entry.name.endswith((".jpg", ".png"))
+                    and entry.is_file()
+                ]
             
             if len(screenshots) > keep_last:
-                for old_file in screenshots[keep_last:]:
+                screenshots.sort(key=itemgetter(0), reverse=True)
+                for _, old_path, old_name in screenshots[keep_last:]:
                     try:
-                        old_file.unlink()
-                        logging.debug(f"Deleted old screenshot: {old_file.name}")
+                        os.unlink(old_path)
+                        logging.debug("Deleted old screenshot: %s", old_name)
                     except Exception as e:
-                        logging.warning(f"Could not delete {old_file}: {e}")
+                        logging.warning("Could not delete %s: %s", old_path, e)
         except Exception as e:
             logging.error(f"Screenshot cleanup failed: {e}")
     
@@ -286,12 +838,10 @@ class UIElementDetector:
     """Detects UI elements using pure OpenCV - no vision models"""
     
     def __init__(self, ollama_client: OllamaClient, screen_analyzer: ScreenAnalyzer):
-        from pathlib import Path
-        from ui_detection_improved import GenericUIDetector
-        
         self.ollama = ollama_client  # Not used, kept for compatibility
         self.screen_analyzer = screen_analyzer
         self.detected_elements = {}  # Cache of detected elements
+        self._decoded_frame: Optional[Tuple[str, Any]] = None  # (screenshot_b64, BGR array) of last decode
         
         # Initialize all UI detectors
         self.start_detector: Optional[StartButtonDetector] = None
@@ -335,9 +885,24 @@ class UIElementDetector:
         except Exception as e:
             logging.warning(f"Search bar detector unavailable: {e}")
         
+        # Query keywords -> detector attribute, checked in priority order
+        self._dispatch: Tuple[Tuple[Tuple[str, ...], str, str], ...] = (
+            (("start button", "start menu", "windows start"), "start_detector", "Start"),
+            (("edge", "browser", "microsoft edge"), "edge_detector", "Edge"),
+            (("file explorer", "folders", "folder", "explorer"), "folders_detector", "Folders"),
+            (("search", "search bar"), "searchbar_detector", "Search bar"),
+        )
+        # All keywords compiled into one pattern so a query is scanned once. The
+        # lookahead reports overlapping matches; table order still decides priority.
+        self._keyword_index = {kw: i for i, (keywords, _, _) in enumerate(self._dispatch) for kw in keywords}
+        self._keyword_re = re.compile(
+            "(?=(" + "|".join(re.escape(kw) for kw in sorted(self._keyword_index, key=len, reverse=True)) + "))"
+        )
+        
         logging.info("✓ OpenCV-based UI detection initialized (no vision models)")
         
-    def detect_elements(self, screenshot_b64: str, element_query: str = None) -> List[Dict]:
+    def detect_elements(self, screenshot_b64: str, element_query: str = None,
+                        scale: Optional[Tuple[float, float]] = None) -> List[Dict]:
         """
         Detect UI elements using pure OpenCV (no vision models)
         Returns list of elements with their exact coordinates
@@ -345,104 +910,41 @@ class UIElementDetector:
         Args:
             screenshot_b64: Base64 encoded screenshot
             element_query: Optional - specific element to find (e.g., "Start button", "Edge browser", "File Explorer")
+            scale: The screenshot's ScreenFrame.scale (default: the last capture's)
         
         Returns:
             List of dicts: [{"name": "Start button", "x": 50, "y": 1400, "width": 40, "height": 40}, ...]
         """
+        return self.detect_in_image(lambda: self._decode(screenshot_b64), element_query,
+                                    scale or self.screen_analyzer.last_scale)
+    
+    def detect_in_image(self, image, element_query: str,
+                        scale: Tuple[float, float] = (1.0, 1.0)) -> List[Dict]:
+        """detect_elements() on a BGR array (or a callable returning one, run only
+        if a detector matches the query); ``scale`` is the image's pixels per
+        screen pixel, (1, 1) for a native-resolution grab."""
         try:
             if not element_query:
                 logging.warning("No element query provided for detection")
                 return []
             
             query_lower = element_query.lower()
+            # Screenshots may be downscaled; detectors search templates at that scale
+            image_scale = sum(scale) / 2
             
-            # Try Start button detector
-            if any(kw in query_lower for kw in ("start button", "start menu", "windows start")):
-                if self.start_detector:
-                    detection = self.start_detector.detect_from_base64(screenshot_b64)
-                    if detection:
-                        element = {
-                            "name": detection.name,
-                            "x": detection.x,
-                            "y": detection.y,
-                            "width": detection.width,
-                            "height": detection.height,
-                            "confidence": round(detection.confidence, 3),
-                            "description": "Detected via OpenCV",
-                            "method": detection.method,
-                        }
-                        logging.info("✓ Found %s at (%d, %d) [conf: %.2f]", 
-                                   element["name"], element["x"], element["y"], element["confidence"])
-                        self.detected_elements[element["name"]] = element
-                        return [element]
-                    logging.warning("Start detector did not find element")
-                    return []
-            
-            # Try Edge browser detector
-            if any(kw in query_lower for kw in ("edge", "browser", "microsoft edge")):
-                if self.edge_detector:
-                    detection = self.edge_detector.detect_from_base64(screenshot_b64)
-                    if detection:
-                        element = {
-                            "name": detection.name,
-                            "x": detection.x,
-                            "y": detection.y,
-                            "width": detection.width,
-                            "height": detection.height,
-                            "confidence": round(detection.confidence, 3),
-                            "description": "Detected via OpenCV",
-                            "method": detection.method,
-                        }
-                        logging.info("✓ Found %s at (%d, %d) [conf: %.2f]", 
-                                   element["name"], element["x"], element["y"], element["confidence"])
-                        self.detected_elements[element["name"]] = element
-                        return [element]
-                    logging.warning("Edge detector did not find element")
-                    return []
-            
-            # Try File Explorer detector
-            if any(kw in query_lower for kw in ("file explorer", "folders", "folder", "explorer")):
-                if self.folders_detector:
-                    detection = self.folders_detector.detect_from_base64(screenshot_b64)
-                    if detection:
-                        element = {
-                            "name": detection.name,
-                            "x": detection.x,
-                            "y": detection.y,
-                            "width": detection.width,
-                            "height": detection.height,
-                            "confidence": round(detection.confidence, 3),
-                            "description": "Detected via OpenCV",
-                            "method": detection.method,
-                        }
-                        logging.info("✓ Found %s at (%d, %d) [conf: %.2f]", 
-                                   element["name"], element["x"], element["y"], element["confidence"])
-                        self.detected_elements[element["name"]] = element
-                        return [element]
-                    logging.warning("Folders detector did not find element")
-                    return []
-            
-            # Try Search bar detector
-            if any(kw in query_lower for kw in ("search", "search bar")):
-                if self.searchbar_detector:
-                    detection = self.searchbar_detector.detect_from_base64(screenshot_b64)
-                    if detection:
-                        element = {
-                            "name": detection.name,
-                            "x": detection.x,
-                            "y": detection.y,
-                            "width": detection.width,
-                            "height": detection.height,
-                            "confidence": round(detection.confidence, 3),
-                            "description": "Detected via OpenCV",
-                            "method": detection.method,
-                        }
-                        logging.info("✓ Found %s at (%d, %d) [conf: %.2f]", 
-                                   element["name"], element["x"], element["y"], element["confidence"])
-                        self.detected_elements[element["name"]] = element
-                        return [element]
-                    logging.warning("Search bar detector did not find element")
-                    return []
+            matched = {self._keyword_index[m.group(1)] for m in self._keyword_re.finditer(query_lower)}
+            for index in sorted(matched):
+                _, attr, label = self._dispatch[index]
+                detector = getattr(self, attr)
+                if not detector:
+                    continue
+                if callable(image):
+                    image = image()
+                detection = detector.detect(image, scale=image_scale)
+                if detection:
+                    return [self._pack(detection, scale)]
+                logging.warning("%s detector did not find element", label)
+                return []
             
             # No detector available for this element
             logging.warning(f"No detector available for '{element_query}'")
@@ -452,6 +954,45 @@ class UIElementDetector:
             logging.error(f"UI element detection failed: {e}")
             return []
     
+    def _decode(self, screenshot_b64: str):
+        """Decode a screenshot once and reuse the array for every detector on that frame"""
+        cached = self._decoded_frame
+        if cached and (cached[0] is screenshot_b64 or cached[0] == screenshot_b64):
+            return cached[1]
+        image = decode_base64_to_cv2(screenshot_b64)
+        self._decoded_frame = (screenshot_b64, image)
+        return image
+    
+    def _pack(self, detection: DetectionResult, scale: Tuple[float, float]) -> Dict:
+        """Convert a detection to screen coordinates, cache it and return the element dict"""
+        detection = self._to_screen(detection, scale)
+        element = {
+            "name": detection.name,
+            "x": detection.x,
+            "y": detection.y,
+            "width": detection.width,
+            "height": detection.height,
+            "confidence": round(detection.confidence, 3),
+            "description": "Detected via OpenCV",
+            "method": detection.method,
+        }
+        logging.info("✓ Found %s at (%d, %d) [conf: %.2f]", 
+                   element["name"], element["x"], element["y"], element["confidence"])
+        self.detected_elements[element["name"]] = element
+        return element
+    
+    def _to_screen(self, detection: DetectionResult, scale: Tuple[float, float]) -> DetectionResult:
+        """Convert a detection from screenshot pixels to screen coordinates"""
+        x, y = self.screen_analyzer.to_screen_coords(detection.x, detection.y, scale)
+        scale_x, scale_y = scale
+        return replace(
+            detection,
+            x=x,
+            y=y,
+            width=int(round(detection.width / scale_x)),
+            height=int(round(detection.height / scale_y)),
+        )
+    
     def find_element(self, element_name: str, screenshot_b64: str = None) -> Optional[Dict]:
         """
         Find a specific UI element by name
@@ -480,12 +1021,24 @@ class UIElementDetector:
         return None
 
 
+def _timestamp() -> str:
+    """Local ISO-8601 timestamp with millisecond precision
+    
+    Cheaper than ``datetime.now().isoformat()``, which resolves tzinfo and
+    builds a datetime object for every recorded action.
+    """
+    now = time.time()
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now)) + ".%03d" % (now % 1 * 1000)
+
+
 class TaskExecutor:
     """Executes tasks based on AI decisions with user permission"""
     
+    MAX_HISTORY = 1000  # Oldest actions are dropped beyond this
+    
     def __init__(self):
         self.pending_actions = []
-        self.action_history = []
+        self.action_history: Deque[Dict] = deque(maxlen=self.MAX_HISTORY)
         self.permissions = {
             "mouse_click": False,
             "keyboard_type": False,
@@ -493,6 +1046,11 @@ class TaskExecutor:
             "system_commands": False
         }
     
+    def _record(self, action: Dict):
+        """Timestamp an executed action and append it to the history"""
+        action["timestamp"] = _timestamp()
+        self.action_history.append(action)
+    
     def request_permission(self, action_type: str) -> bool:
         """Check if permission is granted for action type"""
         return self.permissions.get(action_type, False)
@@ -512,27 +1070,32 @@ class TaskExecutor:
             action = {
                 "type": "mouse_click",
                 "x": x, "y": y,
-                "button": button,
-                "timestamp": datetime.now().isoformat()
+                "button": button
             }
-            self.action_history.append(action)
+            self._record(action)
             return {"success": True, "action": action}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def execute_keyboard_type(self, text: str, interval: float = 0.05) -> Dict:
-        """Type text with permission check"""
+    def execute_keyboard_type(self, text: str, interval: Optional[float] = None) -> Dict:
+        """Type text with permission check
+        
+        On Windows the whole string goes out as one SendInput batch; pass an
+        explicit ``interval`` to type character by character through PyAutoGUI.
+        """
         if not self.request_permission("keyboard_type"):
             return {"success": False, "error": "Permission denied: keyboard_type"}
         
         try:
-            pyautogui.write(text, interval=interval)
+            if win_input.SUPPORTED and interval is None:
+                win_input.send_text(text)
+            else:
+                pyautogui.write(text, interval=0.05 if interval is None else interval)
             action = {
                 "type": "keyboard_type",
-                "text": text[:50],  # Log first 50 chars
-                "timestamp": datetime.now().isoformat()
+                "text": text[:50]  # Log first 50 chars
             }
-            self.action_history.append(action)
+            self._record(action)
             return {"success": True, "action": action}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -546,10 +1109,9 @@ class TaskExecutor:
             pyautogui.press(key)
             action = {
                 "type": "key_press",
-                "key": key,
-                "timestamp": datetime.now().isoformat()
+                "key": key
             }
-            self.action_history.append(action)
+            self._record(action)
             return {"success": True, "action": action}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -560,13 +1122,13 @@ class TaskExecutor:
             return {"success": False, "error": "Permission denied: keyboard_type"}
         
         try:
-            pyautogui.hotkey(*keys)
+            if not (win_input.SUPPORTED and win_input.send_hotkey(*keys)):
+                pyautogui.hotkey(*keys)
             action = {
                 "type": "hotkey",
-                "keys": "+".join(keys),
-                "timestamp": datetime.now().isoformat()
+                "keys": "+".join(keys)
             }
-            self.action_history.append(action)
+            self._record(action)
             return {"success": True, "action": action}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -595,10 +1157,9 @@ class TaskExecutor:
             
             action = {
                 "type": "open_application",
-                "app": app_name,
-                "timestamp": datetime.now().isoformat()
+                "app": app_name
             }
-            self.action_history.append(action)
+            self._record(action)
             return {"success": True, "action": action}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -612,17 +1173,17 @@ class TaskExecutor:
             pyautogui.moveTo(x, y, duration=duration)
             action = {
                 "type": "mouse_move",
-                "x": x, "y": y,
-                "timestamp": datetime.now().isoformat()
+                "x": x, "y": y
             }
-            self.action_history.append(action)
+            self._record(action)
             return {"success": True, "action": action}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
     def get_action_history(self, limit: int = 50) -> List[Dict]:
         """Get recent action history"""
-        return self.action_history[-limit:]
+        history = self.action_history
+        return list(islice(history, max(0, len(history) - limit), None))
     
     def execute_escape(self) -> Dict:
         """Press Escape key - useful for dismissing dialogs"""
@@ -632,79 +1193,78 @@ class TaskExecutor:
         try:
             pyautogui.press('esc')
             action = {
-                "type": "escape",
-                "timestamp": datetime.now().isoformat()
+                "type": "escape"
             }
-            self.action_history.append(action)
+            self._record(action)
             return {"success": True, "action": action}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def execute_alt_tab(self) -> Dict:
+    def execute_alt_tab(self, settle: float = 0.0) -> Dict:
         """Switch to next window"""
         if not self.request_permission("keyboard_type"):
             return {"success": False, "error": "Permission denied: keyboard_type"}
         
         try:
             pyautogui.hotkey('alt', 'tab')
-            time.sleep(0.3)
+            if settle:
+                time.sleep(settle)
             action = {
-                "type": "alt_tab",
-                "timestamp": datetime.now().isoformat()
+                "type": "alt_tab"
             }
-            self.action_history.append(action)
+            self._record(action)
             return {"success": True, "action": action}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def execute_ctrl_n(self) -> Dict:
+    def execute_ctrl_n(self, settle: float = 0.0) -> Dict:
         """Open new window/tab (Ctrl+N) - useful for handling unsaved work prompts"""
         if not self.request_permission("keyboard_type"):
             return {"success": False, "error": "Permission denied: keyboard_type"}
         
         try:
             pyautogui.hotkey('ctrl', 'n')
-            time.sleep(0.5)
+            if settle:
+                time.sleep(settle)
             action = {
                 "type": "ctrl_n",
-                "description": "New window/document",
-                "timestamp": datetime.now().isoformat()
+                "description": "New window/document"
             }
-            self.action_history.append(action)
+            self._record(action)
             return {"success": True, "action": action}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def execute_select_all(self) -> Dict:
+    def execute_select_all(self, settle: float = 0.0) -> Dict:
         """Select all text (Ctrl+A)"""
         if not self.request_permission("keyboard_type"):
             return {"success": False, "error": "Permission denied: keyboard_type"}
         
         try:
             pyautogui.hotkey('ctrl', 'a')
-            time.sleep(0.2)
+            if settle:
+                time.sleep(settle)
             action = {
-                "type": "select_all",
-                "timestamp": datetime.now().isoformat()
+                "type": "select_all"
             }
-            self.action_history.append(action)
+            self._record(action)
             return {"success": True, "action": action}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def execute_save_file(self) -> Dict:
+    def execute_save_file(self, settle: float = 0.0) -> Dict:
         """Save file (Ctrl+S)"""
         if not self.request_permission("file_operations"):
             return {"success": False, "error": "Permission denied: file_operations"}
         
         try:
             pyautogui.hotkey('ctrl', 's')
-            time.sleep(0.3)
+            if settle:
+                time.sleep(settle)
             action = {
-                "type": "save_file",
-                "timestamp": datetime.now().isoformat()
+                "type": "save_file"
             }
-            self.action_history.append(action)
+            self._record(action)
             return {"success": True, "action": action}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -718,10 +1278,9 @@ class TaskExecutor:
             pyautogui.doubleClick(x, y)
             action = {
                 "type": "double_click",
-                "x": x, "y": y,
-                "timestamp": datetime.now().isoformat()
+                "x": x, "y": y
             }
-            self.action_history.append(action)
+            self._record(action)
             return {"success": True, "action": action}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -735,10 +1294,9 @@ class TaskExecutor:
             pyautogui.rightClick(x, y)
             action = {
                 "type": "right_click",
-                "x": x, "y": y,
-                "timestamp": datetime.now().isoformat()
+                "x": x, "y": y
             }
-            self.action_history.append(action)
+            self._record(action)
             return {"success": True, "action": action}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -752,34 +1310,341 @@ class TaskExecutor:
             pyautogui.scroll(amount)
             action = {
                 "type": "scroll",
-                "amount": amount,
-                "timestamp": datetime.now().isoformat()
+                "amount": amount
             }
-            self.action_history.append(action)
+            self._record(action)
             return {"success": True, "action": action}
         except Exception as e:
             return {"success": False, "error": str(e)}
 
 
-class AgentMode:
-    """Main autonomous agent with Ollama integration"""
+def _loads_lenient(text: str) -> Any:
+    """Decode with orjson when available, also accepting Python True/False/None
+    and trailing commas
     
-    def __init__(self, base_dir: Path, ollama_url: str = "http://localhost:11434"):
-        self.base_dir = base_dir
-        self.screenshots_dir = base_dir / "agent_screenshots"
-        self.screenshots_dir.mkdir(exist_ok=True)
-        self.cancel_requested = False  # Emergency stop flag
-        
-        self.ollama = OllamaClient(ollama_url)
+    Every action plan is finalised through here, including the one completed
+    object the streaming parser hands over.
+    """
+    try:
+        return _json_loads(text)
+    except json.JSONDecodeError:
+        pass
+    
+    def fix(match):
+        if match.group(1):
+            return _PY_LITERALS[match.group(1)]
+        if match.group(2) is not None:
+            return match.group(2)
+        return match.group(0)
+    
+    try:
+        return _json_loads(_JSON_REPAIR_RE.sub(fix, text))
+    except json.JSONDecodeError:
+        return None
+
+
+def _close_partial(fragment: str) -> Optional[str]:
+    """Close the strings and brackets left open by a truncated JSON object
+    
+    Only fragments cut off at the top level of the object are repaired; a cut
+    inside ``parameters`` would otherwise turn into an action with missing
+    coordinates.
+    """
+    stack = []
+    in_string = escape = False
+    for char in fragment:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]':
+            if not stack:
+                return None
+            stack.pop()
+    if len(stack) != 1:
+        return None
+    fragment = fragment + '"' if in_string else fragment.rstrip().rstrip(',:')
+    return fragment + stack[0]
+
+
+class _ActionPlanParser:
+    """Incremental scanner that pulls the action JSON object out of model output.
+    
+    Tokens are fed as they stream in. Brace depth and string/escape state are
+    tracked per character, so a complete top-level object is recognised the
+    moment its closing brace arrives and decoded exactly once. Braces in the
+    model's thinking text or around a ```json fence are tolerated, and
+    ``finish()`` repairs output that was cut off by ``num_predict``.
+    """
+    
+    def __init__(self):
+        self.text = ""
+        self.plan: Optional[Dict] = None
+        self._pos = 0
+        self._depth = 0
+        self._start = -1
+        self._in_string = False
+        self._escape = False
+        self._partial_action: Optional[Tuple[int, str]] = None  # (object start, action) once seen
+    
+    @property
+    def action(self) -> Optional[str]:
+        """The plan's action name as soon as it has streamed in, else None"""
+        if self.plan is not None:
+            return str(self.plan.get("action", "")).lower() or None
+        if self._start < 0:
+            return None
+        # Remembered per object so the growing text is not searched on every token
+        if self._partial_action and self._partial_action[0] == self._start:
+            return self._partial_action[1]
+        match = _ACTION_FIELD_RE.search(self.text, self._start)
+        if not match:
+            return None
+        self._partial_action = (self._start, match.group(1).lower())
+        return self._partial_action[1]
+    
+    @property
+    def element_name(self) -> Optional[str]:
+        """detect_ui_element's element_name as soon as it has streamed in, else None"""
+        if self.plan is not None:
+            parameters = self.plan.get("parameters")
+            return parameters.get("element_name") if isinstance(parameters, dict) else None
+        if self._start < 0:
+            return None
+        match = _ELEMENT_NAME_RE.search(self.text, self._start)
+        return match.group(1) if match else None
+    
+    def feed(self, chunk: str) -> Optional[Dict]:
+        """Consume a chunk of model output; returns the plan once it is complete"""
+        self.text += chunk
+        if self.plan is None:
+            self._scan()
+        return self.plan
+    
+    def parse(self, text: str) -> Optional[Dict]:
+        """Consume a complete response in one go
+        
+        A plan inside a ```json fence is decoded straight from the regex match,
+        skipping the per-character scan; anything else goes through ``feed``.
+        """
+        match = _JSON_FENCE_RE.search(text)
+        if match:
+            candidate = _loads_lenient(match.group(1))
+            if isinstance(candidate, dict) and "action" in candidate:
+                self.text += text
+                self._pos = len(self.text)
+                self.plan = candidate
+                return candidate
+        return self.feed(text)
+    
+    def _scan(self):
+        text = self.text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif self._depth == 0:
+                # Outside any object quotes are prose, only an opening brace matters
+                if char == '{':
+                    self._start = i
+                    self._depth = 1
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = _loads_lenient(text[self._start:i + 1])
+                    if isinstance(candidate, dict) and "action" in candidate:
+                        self.plan = candidate
+                        self._pos = i + 1
+                        return
+                    self._start = -1
+        self._pos = len(text)
+    
+    def finish(self) -> Optional[Dict]:
+        """Return the plan, falling back to slower recovery for odd output"""
+        if self.plan is not None:
+            return self.plan
+        text = self.text
+        
+        # Objects the single pass could not isolate, e.g. after an unbalanced
+        # brace in the thinking text: let the C decoder try every '{'
+        start = text.find('{')
+        while start != -1:
+            try:
+                candidate, _ = _JSON_DECODER.raw_decode(text, start)
+            except json.JSONDecodeError:
+                candidate = None
+            if isinstance(candidate, dict) and "action" in candidate:
+                self.plan = candidate
+                return candidate
+            start = text.find('{', start + 1)
+        
+        # Truncated output: close the open object, or drop the cut-off field
+        if self._start >= 0 and self._depth > 0:
+            fragment = text[self._start:]
+            for attempt in (fragment, fragment[:fragment.rfind(',')]):
+                repaired = _close_partial(attempt)
+                candidate = _loads_lenient(repaired) if repaired else None
+                if isinstance(candidate, dict) and "action" in candidate and "parameters" in candidate:
+                    logging.warning("[Agent] Recovered action plan from truncated response")
+                    self.plan = candidate
+                    return candidate
+        return None
+
+
+def _parse_action_plan(response_text: str) -> Optional[Dict]:
+    """Extract the action plan from a complete model response"""
+    parser = _ActionPlanParser()
+    parser.parse(response_text)
+    return parser.finish()
+
+
+@dataclass(frozen=True)
+class _ActionSpec:
+    """How the agent loop runs one simple TaskExecutor action"""
+    
+    handler: Callable[..., Dict]
+    params: Tuple[Tuple[str, Any], ...] = ()  # (parameter name, default) passed as keywords
+    settle: float = 0.0  # Seconds to let the UI react after success
+    blind: bool = False  # Sit out the whole settle before polling for a redraw
+    result: Optional[str] = None  # Step result for the prompt context, formatted with the params
+    log: Optional[str] = None  # Execution log line on success, formatted with the params
+
+
+class _OverlayTokenPump:
+    """Forward streamed tokens to the overlay from a worker thread.
+
+    Overlay updates can block for milliseconds on the GUI side; queueing them
+    keeps the NDJSON reader draining the socket at network speed.
+    """
+    
+    def __init__(self, overlay):
+        self.overlay = overlay
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="agent-overlay-tokens", daemon=True)
+        self._thread.start()
+    
+    def put(self, token: str):
+        self._queue.put(token)
+    
+    def flush(self):
+        """Block until every queued token has reached the overlay"""
+        self._queue.join()
+    
+    def close(self, timeout: float = 2.0):
+        self._queue.put(None)
+        self._thread.join(timeout)
+    
+    def _run(self):
+        while True:
+            token = self._queue.get()
+            try:
+                if token is None:
+                    return
+                self.overlay.append_token(token)
+            except Exception as e:
+                logging.debug("[Agent] Overlay token update failed: %s", e)
+            finally:
+                self._queue.task_done()
+
+
+class _StreamWatchdog:
+    """Close a streaming response once tokens stop arriving.
+
+    The HTTP read timeout has to allow for a cold model load before the first
+    token, so it cannot also catch a stream that stalls halfway. The watchdog
+    only arms after the first token and closes the response when no further
+    token arrives within ``stall_timeout`` seconds.
+    """
+    
+    def __init__(self, response, stall_timeout: float):
+        self.response = response
+        self.stall_timeout = stall_timeout
+        self.stalled = False
+        self._last_token: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="agent-stream-watchdog", daemon=True)
+        self._thread.start()
+    
+    def feed(self):
+        self._last_token = time.monotonic()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def _run(self):
+        while not self._stop.wait(1.0):
+            last = self._last_token
+            if last is not None and time.monotonic() - last > self.stall_timeout:
+                self.stalled = True
+                try:
+                    self.response.close()
+                except Exception:
+                    pass
+                return
+
+
+class AgentMode:
+    """Main autonomous agent with Ollama integration"""
+    
+    REQUEST_TIMEOUT = (5, 300)  # (connect, read) - reads must survive a cold model load
+    STREAM_STALL_TIMEOUT = 15.0  # Seconds without a token before a started stream is abandoned
+    MAX_LOG_LINES = 200  # execute_task keeps only the newest log lines
+    SCREEN_POLL_INTERVAL = 1 / 60  # Pause between fingerprints while waiting for a redraw
+    SETTLED_GRAB_MAX_AGE = 0.1  # Oldest poll grab that may stand in for a fresh capture
+    MAX_CHAIN_STEPS = 10  # Sub-actions run from one chain action, the rest are ignored
+    # Long edge of step frames unless the model needs detail; vision tokens
+    # scale with image area, so this is roughly half the full-size cost
+    NAVIGATION_MAX_DIMENSION = 768
+    MAX_WAIT_REPLAYS = 2  # Times a wait is repeated on an unchanged screen before asking the model again
+    MAX_CHAT_MESSAGES = 40  # Chat history kept for context (20 exchanges)
+    GC_RSS_GROWTH = 200 * 1024 * 1024  # Resident memory growth (bytes) that triggers a full collection
+    
+    def __init__(self, base_dir: Path, ollama_url: str = "http://localhost:11434", keep_alive: str = "30m"):
+        self.base_dir = base_dir
+        self.screenshots_dir = base_dir / "agent_screenshots"
+        self.screenshots_dir.mkdir(exist_ok=True)
+        self.cancel_requested = False  # Emergency stop flag
+        self.keep_alive = keep_alive  # How long Ollama keeps the model resident between requests
+        self._active_response = None  # Streaming response of the in-flight agent step
+        
+        self.ollama = OllamaClient(ollama_url)
+        self.session = self.ollama.session  # One connection pool for every Ollama call
         self.screen_analyzer = ScreenAnalyzer(self.screenshots_dir)
         self.task_executor = TaskExecutor()
         self.ui_detector = UIElementDetector(self.ollama, self.screen_analyzer)
+        self._action_table = self._build_action_table()
         
         self.current_model = None
-        self.conversation_history = []
+        self._use_streaming = True  # False for models that must not stream (qwen3-vl), see set_model
+        # Newest chat messages only (user + assistant pairs); older turns drop
+        # out instead of growing every prompt sent to Ollama
+        self.conversation_history: Deque[Dict] = deque(maxlen=self.MAX_CHAT_MESSAGES)
         self.active = False
         self.task_queue = []
         self.last_detected_coords = None  # Store last detected UI element coordinates
+        self._last_screenshot_hash: Optional[bytes] = None  # Fingerprint of last step's frame
+        self._last_screenshot_b64: Optional[str] = None
+        self._vision_cache: Dict[bytes, str] = {}  # Frame hash -> model's observation of it
+        self._detect_cache: Dict[Tuple[bytes, str], List[Dict]] = {}  # (frame hash, query) -> elements
+        self._loaded_models: set = set()  # Every model selected this session, for emergency unloads
+        self._rss_baseline = self._current_rss()
+        self._screen_prompt: Optional[Tuple[str, str]] = None  # (screen_size, instructions), see _get_screen_prompt
         
         # Initialize overlay
         self.overlay = None
@@ -789,8 +1654,75 @@ class AgentMode:
         except Exception as e:
             logging.warning(f"Could not initialize overlay: {e}")
         
-    def cancel_operation(self) -> Dict:
-        """Emergency stop - INSTANT cancel current operation and unload model"""
+    def _build_action_table(self) -> Dict[str, _ActionSpec]:
+        """Map action names from the model to TaskExecutor calls
+        
+        complete, detect_ui_element, chain and wait are handled inline in
+        execute_task. Every table action may appear inside a chain.
+        """
+        executor = self.task_executor
+        xy = (("x", 0), ("y", 0))
+        return {
+            "mouse_click": _ActionSpec(executor.execute_mouse_click, xy + (("button", "left"),), 0.5,
+                                       result="Clicked at ({x}, {y})"),
+            "keyboard_type": _ActionSpec(executor.execute_keyboard_type, (("text", ""),), 0.3,
+                                         result="Typed: {text:.50}", log="✓ Typed: {text}"),
+            "key_press": _ActionSpec(executor.execute_key_press, (("key", ""),), 0.3),
+            "mouse_move": _ActionSpec(executor.execute_mouse_move, xy, 0.2),
+            "double_click": _ActionSpec(executor.execute_double_click, xy, 0.5),
+            "right_click": _ActionSpec(executor.execute_right_click, xy, 0.5),
+            "escape": _ActionSpec(executor.execute_escape, settle=0.3),
+            "ctrl_n": _ActionSpec(executor.execute_ctrl_n, settle=0.7),
+            "select_all": _ActionSpec(executor.execute_select_all, settle=0.2),
+            "save_file": _ActionSpec(executor.execute_save_file, settle=0.3),
+            "alt_tab": _ActionSpec(executor.execute_alt_tab, settle=0.5),
+            "scroll": _ActionSpec(executor.execute_scroll, (("amount", 3),), 0.3),
+            "hotkey": _ActionSpec(self._hotkey_action, (("keys", []),), 0.5),
+            # A launched app takes a while to draw anything, and an unrelated
+            # redraw (e.g. a blinking caret) must not cut that short
+            "open_app": _ActionSpec(self._open_app_action, (("app", ""),), 1.5, blind=True,
+                                    result="Opened {app} successfully", log="  ✓ Opened {app}"),
+        }
+    
+    def _hotkey_action(self, keys) -> Dict:
+        if not isinstance(keys, list) or not keys:
+            return {"success": False, "error": "Invalid hotkey parameters"}
+        return self.task_executor.execute_hotkey(*keys)
+    
+    def _open_app_action(self, app: str) -> Dict:
+        if not app:
+            return {"success": False, "error": "No app specified"}
+        result = self.task_executor.open_application(app)
+        if result["success"]:
+            logging.info("[Agent] Successfully opened: %s", app)
+        else:
+            logging.error("[Agent] Failed to open %s: %s", app, result['error'])
+        return result
+    
+    def _run_table_action(self, spec: _ActionSpec, parameters: Dict,
+                          scale: Tuple[float, float] = (1.0, 1.0)) -> Tuple[Dict, Dict]:
+        """Call a table action with its parameters; returns (result, args as the model gave them)
+        
+        x/y from the model are pixels of the (possibly downscaled) frame it
+        looked at; ``scale`` is that frame's, and maps them to the screen.
+        """
+        args = {name: parameters.get(name, default) for name, default in spec.params}
+        call_args = args
+        if "x" in args and "y" in args:
+            try:
+                x, y = self.screen_analyzer.to_screen_coords(float(args["x"]), float(args["y"]), scale)
+                call_args = {**args, "x": x, "y": y}
+            except (TypeError, ValueError):
+                pass  # The executor reports the bad coordinates
+        return spec.handler(**call_args), args
+    
+    def cancel_operation(self, unload_models: bool = False) -> Dict:
+        """Emergency stop - INSTANT cancel current operation
+        
+        The in-flight Ollama request is aborted by closing its streaming
+        response, which leaves the model resident for the next task. Pass
+        ``unload_models=True`` to also evict every model from VRAM.
+        """
         logging.info("[Agent] EMERGENCY STOP requested - FORCING IMMEDIATE CANCELLATION")
         self.cancel_requested = True
         
@@ -802,27 +1734,26 @@ class AgentMode:
             except:
                 pass
         
-        # Kill any ongoing Ollama requests by unloading ALL models
-        try:
-            # Get list of loaded models
-            response = requests.get(f"{self.ollama.base_url}/api/tags", timeout=2)
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                for model_info in models:
-                    model_name = model_info.get('name', '')
-                    if model_name:
-                        logging.info(f"[Emergency] Unloading: {model_name}")
-                        self.ollama.unload_model(model_name)
-        except Exception as e:
-            logging.warning(f"Could not unload all models: {e}")
+        # Drop the connection of the in-flight generation; Ollama stops
+        # generating once the client disconnects
+        response = self._active_response
+        if response is not None:
+            try:
+                response.close()
+            except Exception as e:
+                logging.warning("Could not abort in-flight request: %s", e)
         
-        # Unload current model
-        if self.current_model:
-            logging.info(f"[Agent] Force unloading model: {self.current_model}")
-            self.ollama.unload_model(self.current_model)
+        if not unload_models:
+            logging.info("[Agent] EMERGENCY STOP complete")
+            return {
+                "success": True,
+                "message": "⚠️ EMERGENCY STOP - All operations cancelled"
+            }
+        
+        # Kill any ongoing Ollama requests by unloading ALL models
+        self._unload_models()
         
         # Force garbage collection
-        import gc
         gc.collect()
         
         logging.info("[Agent] EMERGENCY STOP complete")
@@ -831,6 +1762,52 @@ class AgentMode:
             "message": "⚠️ EMERGENCY STOP - All operations cancelled and models unloaded"
         }
     
+    def _unload_models(self, timeout: float = 3.0):
+        """Evict every model from Ollama's memory
+        
+        /api/ps lists what is actually loaded; models selected this session
+        are included in case the server is too old to have that endpoint.
+        """
+        models = set(self._loaded_models)
+        if self.current_model:
+            models.add(self.current_model)
+        try:
+            response = self.session.get(f"{self.ollama.base_url}/api/ps", timeout=2)
+            if response.status_code == 200:
+                for model_info in _json_loads(response.content).get('models', []):
+                    if model_info.get('name'):
+                        models.add(model_info['name'])
+        except Exception as e:
+            logging.warning("Could not list loaded models: %s", e)
+        
+        # Unloads are independent POSTs: send them all at once and give up
+        # waiting after a few seconds so the stop stays responsive
+        if models:
+            logging.info("[Agent] Unloading: %s", ", ".join(sorted(models)))
+            executor = ThreadPoolExecutor(max_workers=len(models), thread_name_prefix="agent-unload")
+            futures = [executor.submit(self.ollama.unload_model, name) for name in models]
+            _, pending = wait(futures, timeout=timeout)
+            executor.shutdown(wait=False)
+            if pending:
+                logging.warning("[Agent] %d unload(s) still running in the background", len(pending))
+        self._loaded_models.clear()
+    
+    def shutdown(self):
+        """Explicit teardown: stop any running task and free the models
+        
+        Tasks leave the model resident so the next one starts without a
+        reload; Ollama evicts it after ``keep_alive`` of inactivity, or here
+        when the app exits.
+        """
+        self.cancel_requested = True
+        response = self._active_response
+        if response is not None:
+            try:
+                response.close()
+            except Exception:
+                pass
+        self._unload_models()
+    
     def check_ollama_status(self) -> Dict:
         """Check if Ollama is available and get models"""
         connected = self.ollama.check_connection()
@@ -848,6 +1825,8 @@ class AgentMode:
             models = self.ollama.list_models()
             if model in models:
                 self.current_model = model
+                self._use_streaming = "qwen3-vl" not in model.lower()
+                self._loaded_models.add(model)
                 return {"success": True, "model": model}
             else:
                 return {"success": False, "error": f"Model '{model}' not found"}
@@ -868,7 +1847,8 @@ class AgentMode:
         result = self.ollama.generate(
             model=self.current_model,
             prompt=prompt,
-            images=[screenshot_base64]
+            images=[screenshot_base64],
+            keep_alive=self.keep_alive
         )
         
         if result["success"]:
@@ -882,6 +1862,123 @@ class AgentMode:
         else:
             return result
     
+    @staticmethod
+    def _current_rss() -> Optional[int]:
+        if psutil is None:
+            return None
+        try:
+            return psutil.Process().memory_info().rss
+        except Exception:
+            return None
+    
+    def _collect_if_grown(self):
+        """Run a full gc pass only when the process has grown noticeably
+        
+        A forced collection walks every tracked object (detector arrays, the
+        Flask app, ...) and stalls for a noticeable time; after most tasks
+        there is nothing worth reclaiming.
+        """
+        rss = self._current_rss()
+        if rss is None or self._rss_baseline is None:
+            return
+        if rss - self._rss_baseline > self.GC_RSS_GROWTH:
+            gc.collect()
+            self._rss_baseline = self._current_rss()
+            logging.info("[Agent] Memory grew by >%d MB, ran garbage collection", self.GC_RSS_GROWTH // (1024 * 1024))
+    
+    def _get_screen_prompt(self) -> Tuple[str, str]:
+        """Return the screen size string and the static prompt built from it
+        
+        The resolution is queried once per session; call refresh_screen_info()
+        after the display mode changes.
+        """
+        if self._screen_prompt is None:
+            screen_info = self.screen_analyzer.get_screen_info()
+            screen_size = f"{screen_info.get('width', 0)}x{screen_info.get('height', 0)}"
+            self._screen_prompt = (screen_size, _AGENT_INSTRUCTIONS_TEMPLATE.format(screen_size=screen_size))
+        return self._screen_prompt
+    
+    def refresh_screen_info(self) -> Dict:
+        """Forget the cached screen resolution (e.g. after a resolution or DPI change)"""
+        self._screen_prompt = None
+        screen_size, _ = self._get_screen_prompt()
+        return {"success": True, "screen_size": screen_size}
+    
+    def _wait_for_screen_change(self, prev_hash: Optional[bytes], timeout: float, min_wait: float = 0.05) -> bool:
+        """Wait until the screen reacts to an action instead of sleeping blindly
+        
+        Polls screen fingerprints until one differs from ``prev_hash`` and the
+        next poll matches it again (the redraw has settled), or ``timeout``
+        elapses. Returns True if a change was seen.
+        """
+        deadline = time.monotonic() + timeout
+        time.sleep(min_wait)
+        if prev_hash is None:
+            # No baseline to compare against: fall back to the fixed pause
+            time.sleep(max(0.0, deadline - time.monotonic()))
+            return True
+        changed = False
+        last = prev_hash
+        # Bound once; this loop runs at the poll rate
+        fingerprint, monotonic, sleep = self.screen_analyzer.fingerprint, time.monotonic, time.sleep
+        interval = self.SCREEN_POLL_INTERVAL
+        while monotonic() < deadline:
+            current = fingerprint()
+            if current is None:
+                break
+            if current != prev_hash:
+                if changed and current == last:
+                    return True
+                changed = True
+            last = current
+            sleep(interval)
+        return changed
+    
+    def _detect_cached(self, frame: ScreenFrame, element_name: str) -> List[Dict]:
+        """Detect an element on a step frame, memoised on the frame digest and query
+        
+        Detection runs on the frame's unscaled grab, so templates are matched
+        at native size rather than on the downscaled image sent to the model.
+        The model often asks for the same element again after a missed click;
+        on an unchanged frame that answer is reused without running OpenCV.
+        """
+        key = (frame.digest, element_name.strip().lower())
+        if key in self._detect_cache:
+            return self._detect_cache[key]
+        if frame.source is not None:
+            elements = self.ui_detector.detect_in_image(lambda: pil_to_cv2(frame.source), element_name)
+        else:
+            elements = self.ui_detector.detect_elements(frame.b64, element_query=element_name, scale=frame.scale)
+        self._detect_cache[key] = elements
+        if len(self._detect_cache) > 64:
+            del self._detect_cache[next(iter(self._detect_cache))]
+        return elements
+    
+    def _capture_step_screenshot(self, max_age: float = 0.0,
+                                 max_dimension: Optional[int] = None) -> Tuple[Optional[str], bool, Optional[ScreenFrame]]:
+        """Capture the screen for an agent step
+        
+        Returns (base64, changed, frame). The digest is computed once per
+        frame (ScreenFrame.digest) and keys the unchanged-frame check, the
+        observation cache and the detection cache; when it matches the
+        previous step the previous base64 string is reused instead of being
+        encoded again. ``max_age`` is passed to capture_frame() to reuse the
+        grab from the post-action change poll; ``max_dimension`` picks the
+        frame size (None for the analyzer's max_dimension).
+        """
+        # The unscaled grab rides along for detect_ui_element steps
+        frame = self.screen_analyzer.capture_frame(max_age=max_age, max_dimension=max_dimension, keep_source=True)
+        if frame is None:
+            return None, True, None
+        
+        frame_hash = frame.digest
+        if frame_hash == self._last_screenshot_hash and self._last_screenshot_b64:
+            return self._last_screenshot_b64, False, frame
+        
+        self._last_screenshot_hash = frame_hash
+        self._last_screenshot_b64 = frame.b64
+        return self._last_screenshot_b64, True, frame
+    
     def execute_task(self, task: str, auto_execute: bool = True) -> Dict:
         """Execute a task with AI reasoning and automatic multi-step execution"""
         if not self.current_model:
@@ -904,22 +2001,42 @@ class AgentMode:
         enhanced_task = enhance_task_prompt(task)
         task_hints = get_task_hints(task)
         
-        logging.info(f"[Agent] Starting task: {task}")
+        logging.info("[Agent] Starting task: %s", task)
         if task_hints.get("detected_intent"):
-            logging.info(f"[Agent] Detected intent: {task_hints['detected_intent']}")
+            logging.info("[Agent] Detected intent: %s", task_hints['detected_intent'])
         
-        execution_log = []
+        execution_log: Deque[str] = deque(maxlen=self.MAX_LOG_LINES)
         execution_log.append(f"Original task: {task}")
         if task_hints.get("suggested_actions"):
             execution_log.append(f"Detected intent: {task_hints['detected_intent']}")
         
         steps_completed = 0
         max_steps = 15  # Increased for complex tasks like YouTube browsing
-        last_action = None  # Track last action to detect loops
-        repeat_count = 0  # Count how many times same action repeats
+        recent_actions: Deque[int] = deque(maxlen=6)  # Hashed (action, parameters) of the last steps, for loop detection
         
         # Initialize conversation context for this task
-        task_context = []  # Store previous steps to maintain context
+        # (action, reasoning, result) of the last 5 steps, all the prompt shows
+        task_context: Deque[Tuple[str, str, Any]] = deque(maxlen=5)
+        
+        # Screen dimensions for AI awareness and the static part of the prompt
+        # that depends on them, cached for the session
+        screen_size, instructions = self._get_screen_prompt()
+        last_action_type = None
+        screenshot_base64 = None
+        frame: Optional[ScreenFrame] = None  # Frame the current step looks at
+        frame_hash: Optional[bytes] = None  # Its digest
+        frame_scale = (1.0, 1.0)  # Its image pixels per screen pixel; model x/y are in image pixels
+        image_size = screen_size
+        screen_dirty = True  # Whether the last step may have changed the screen
+        last_wait = 1  # Seconds of the model's last wait action
+        wait_replays = 0  # Repeats of the model's last wait made without asking it again
+        capture_dimension: Optional[int] = self.NAVIGATION_MAX_DIMENSION  # None = analyzer's max_dimension
+        
+        # The next frame is grabbed and encoded on a worker while the loop does
+        # its bookkeeping; overlay tokens are drawn from their own thread
+        capture_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent-capture")
+        next_capture: Optional[Future] = None
+        token_pump = _OverlayTokenPump(self.overlay) if self.overlay else None
         
         try:
             # Reset cancel flag at start
@@ -933,177 +2050,77 @@ class AgentMode:
                     return {
                         "success": False,
                         "error": "Operation cancelled by user",
-                        "execution_log": execution_log,
+                        "execution_log": list(execution_log),
                         "steps_completed": steps_completed
                     }
                 
                 # IMPORTANT: Capture screenshot BEFORE showing overlay
                 # This prevents AI from seeing its own reasoning text
-                screenshot_base64 = self.screen_analyzer.capture_screen()
+                if next_capture is None and (screen_dirty or not screenshot_base64):
+                    next_capture = capture_pool.submit(self._capture_step_screenshot, 0.0, capture_dimension)
+                
+                # Build context from previous steps
+                context_summary = ""
+                if task_context:
+                    lines = ["\n\nPREVIOUS STEPS (what you've already done):\n"]
+                    for i, (prev_action, prev_reasoning, prev_result) in enumerate(task_context, 1):
+                        lines.append(f"{i}. {prev_action}: {prev_reasoning}\n")
+                        if prev_result:
+                            lines.append(f"   Result: {prev_result}\n")
+                    lines.append("\nRemember what you already did! Don't repeat successful actions.\n")
+                    context_summary = "".join(lines)
+                
+                if next_capture is not None:
+                    screenshot_base64, screen_changed, captured = next_capture.result()
+                    next_capture = None
+                    if captured is not None:
+                        frame = captured
+                        frame_hash, frame_scale = frame.digest, frame.scale
+                        image_size = f"{frame.width}x{frame.height}"
+                    if screen_changed:
+                        # Detections on older frames can no longer be hit
+                        self._detect_cache.clear()
+                else:
+                    # Nothing sent input last step, so its frame is still current
+                    screen_changed = False
+                screen_dirty = False
+                
+                # Ask AI what to do next - with thinking allowed but JSON required.
+                # Formatted after the capture so it names this frame's size.
+                prompt = _AGENT_STEP_PROMPT.format(
+                    enhanced_task=enhanced_task,
+                    step=step + 1,
+                    max_steps=max_steps,
+                    screen_size=screen_size,
+                    image_size=image_size,
+                    context_summary=context_summary
+                )
                 
                 # Screenshot captured - overlay is always visible (click-through enabled)
                 
                 if not screenshot_base64:
                     return {"success": False, "error": "Failed to capture screen"}
                 
-                # Get screen dimensions for AI awareness
-                screen_info = self.screen_analyzer.get_screen_info()
-                screen_size = f"{screen_info.get('width', 0)}x{screen_info.get('height', 0)}"
+                # The model asked to wait for something and the screen has not
+                # moved since: it would only ask to wait again, so do that
+                # without a model round-trip (a bounded number of times)
+                if not screen_changed and last_action_type == "wait" and wait_replays < self.MAX_WAIT_REPLAYS:
+                    wait_replays += 1
+                    logging.info("[Agent] Screen unchanged after wait, waiting %ss more without asking the model", last_wait)
+                    execution_log.append(f"Step {step + 1}: wait (screen unchanged, waited {last_wait} seconds more)")
+                    time.sleep(last_wait)
+                    screen_dirty = True
+                    continue
+                if screen_changed:
+                    wait_replays = 0
                 
-                # Build context from previous steps
-                context_summary = ""
-                if task_context:
-                    context_summary = "\n\nPREVIOUS STEPS (what you've already done):\n"
-                    for i, ctx in enumerate(task_context[-5:], 1):  # Show last 5 steps only
-                        context_summary += f"{i}. {ctx['action']}: {ctx['reasoning']}\n"
-                        if ctx.get('result'):
-                            context_summary += f"   Result: {ctx['result']}\n"
-                    context_summary += "\nRemember what you already did! Don't repeat successful actions.\n"
-                
-                # Ask AI what to do next - with thinking allowed but JSON required
-                prompt = f"""TASK: {enhanced_task}
-Step {step + 1}/{max_steps} | Screen Resolution: {screen_size}
-{context_summary}
-ANALYZE THE FULL RESOLUTION SCREENSHOT:
-Look carefully at what's on screen. Describe what you see, then decide the next action.
-
-You can THINK OUT LOUD, but your final response MUST end with valid JSON in this format:
-
-THINKING: [Describe what you see and your reasoning]
-
-```json
-{{
-    "observation": "what I see on screen",
-    "action": "action_name",
-    "reasoning": "why this action",
-    "parameters": {{}},
-    "task_complete": false
-}}
-```
-
-AVAILABLE ACTIONS (prefer mouse-based interaction):
-
-**PRIMARY ACTIONS** (use these for navigation):
-- detect_ui_element: {{"element_name": "Start button"}} - **PREFERRED**: Auto-detect UI element and get EXACT coordinates
-- mouse_move: {{"x": 100, "y": 200}} - Move mouse to specific coordinates (use before clicking)
-- mouse_click: {{"x": 100, "y": 200, "button": "left"}} - Click at coordinates (left/right/middle)
-- double_click: {{"x": 100, "y": 200}} - Double-click at coordinates (opens files/folders)
-- right_click: {{"x": 100, "y": 200}} - Right-click for context menus
-
-**INTERACTION ACTIONS**:
-- keyboard_type: {{"text": "your text here"}} - Type text in focused window
-- key_press: {{"key": "enter"}} - Press single key (enter, tab, escape, space, etc.)
-- hotkey: {{"keys": ["ctrl", "c"]}} - Press key combinations (ctrl+c, alt+tab, win+r, etc.)
-- scroll: {{"amount": 3}} - Scroll mouse wheel (positive=down, negative=up)
-
-**UTILITY ACTIONS**:
-- wait: {{"seconds": 2}} - Wait for UI to respond/load
-- complete: {{}} - Mark task as finished
-
-**DISCOURAGED** (only use if mouse navigation impossible):
-- open_app: {{"app": "appname"}} - Launch application via command line
-
-**💡 TIP: Use detect_ui_element FIRST before manual coordinate guessing!**
-Example: detect_ui_element with "Start button", "Calculator icon", "Close button", etc.
-This gives you EXACT pixel coordinates automatically!
-
-**CRITICAL: HOW TO FIND COORDINATES IN SCREENSHOTS**:
-
-Screen dimensions: {screen_size} pixels
-Coordinate system: (0, 0) = top-left corner, ({screen_size}) = bottom-right corner
-
-**STEP-BY-STEP COORDINATE FINDING**:
-
-1. **Identify the target element** in the screenshot image (button, icon, text field, etc.)
-
-2. **Estimate its position using visual grid method**:
-   - Imagine the screen divided into a 10x10 grid
-   - Count grid squares from left edge to find element's horizontal position
-   - Count grid squares from top edge to find element's vertical position
-   
-3. **Convert grid position to pixel coordinates**:
-   - Example for screen size 2560x1440:
-     * If element is 1/10 from left → x ≈ 256 pixels
-     * If element is 5/10 from left → x ≈ 1280 pixels (middle)
-     * If element is 9/10 from left → x ≈ 2304 pixels
-     * If element is 9/10 from top → y ≈ 1296 pixels (near bottom)
-   - ALWAYS target the CENTER of the element, not its edge
-
-4. **Common UI element positions to help calibrate**:
-   - Windows Start button: Very bottom-left corner (x≈20-60, y≈screen_height-30)
-   - Taskbar icons: Bottom row (y≈screen_height-30 to screen_height-50)
-   - Window close button (X): Top-right of window title bar
-   - Maximize/minimize: Just left of close button
-   
-5. **Adaptive clicking strategy**:
-   - Make your best coordinate estimate from visual analysis
-   - If you miss, use mouse_move to relocate and try again
-   - Adjust by ±50-100 pixels in the direction you need to move
-- **Window title bars**: Top of each window (look for minimize/maximize/close buttons)
-- **Start button**: Bottom-left area (examine screenshot to find exact Windows logo position)
-- **System tray**: Bottom-right area (look for clock, notification icons)
-
-**DO NOT use hardcoded coordinates! ALWAYS estimate from visual analysis!**
-
-UNIVERSAL WINDOW DETECTION GUIDE:
-Examine the ENTIRE screen systematically. Look for these universal window features:
-
-**Title Bar Identification** (top edge of windows):
-- Look for rectangular bars at the TOP of any window
-- Title bars contain: app name, document name, or "Untitled"
-- Right side has: minimize (-), maximize (□), close (X) buttons
-- Examples: "Untitled - Notepad", "Calculator", "Google Chrome", "Document1 - Word"
-
-**Window Components to Check**:
-1. **Menu Bar** (directly below title bar): File, Edit, View, Tools, Help, etc.
-2. **Toolbar** (icons/buttons for common actions)
-3. **Content Area** (main work area - white for text editors, varied for others)
-4. **Status Bar** (bottom edge showing info like "Ln 1, Col 1", zoom level, etc.)
-
-**Application-Specific Patterns**:
-- **Text Editors** (Notepad, Word): White background, menu bar, text cursor, status bar
-- **Calculators**: Number pad (0-9), operators (+, -, x, ÷), display area showing numbers
-- **Browsers** (Chrome, Edge): Address bar with URL, tabs at top, navigation buttons (←, →, ⟳)
-- **File Explorer**: Folder tree on left, file list on right, address bar showing path
-- **Command Prompts/Terminals**: Black or dark background, monospace text, command line prompt
-
-**Detection Strategy**:
-1. Scan from TOP to BOTTOM of screen
-2. Check each visible window's title bar for app names
-3. Look for PARTIAL visibility - even 20% of a window counts as "visible"
-4. Don't assume windows are hidden just because they're small or partially covered
-5. Check the TASKBAR at bottom for open application icons
-
-**Common Mistakes to Avoid**:
-❌ "No window visible" when window is partially covered - WRONG!
-✅ "Window visible but partially covered by another window" - CORRECT!
-❌ Saying an app isn't open when you can see its title bar - WRONG!
-✅ Recognizing any visible title bar or menu means that app IS OPEN - CORRECT!
-
-**Task Execution Strategy**:
-1. **Understand the Goal**: Break down what needs to be achieved
-2. **Assess Current State**: What's already on screen? What's missing?
-3. **Plan Minimal Steps**: Use the FEWEST actions to complete the task
-4. **Adapt to Reality**: If something already exists, skip creating it
-5. **Verify Progress**: Check if each action had the expected effect
-
-**Smart Decision Making**:
-- **PREFER MOUSE OVER COMMANDS**: Instead of open_app, click Start menu and search
-- **Locate Visual Elements**: Find buttons, icons, links on screen and click them
-- **Use Taskbar**: Click taskbar icons to switch between open applications
-- **Estimate Coordinates**: Look at element positions and estimate x,y coordinates
-- **Focus Windows**: Click on a window's title bar or content area to focus it
-- **Navigate Naturally**: Use mouse like a human would - click buttons, links, icons
-- **Verify Clicks Work**: If a click doesn't work, try a different coordinate nearby
-- **Search for Apps**: Win+S or click Start → type app name → click result
-
-**EXAMPLES OF PROPER MOUSE NAVIGATION**:
-✅ "To open Notepad: mouse_click Start button (10, 1430) → keyboard_type 'notepad' → mouse_click first result"
-✅ "To focus window: mouse_click on its title bar or visible content area"
-✅ "To click button: estimate button center coordinates from visual inspection"
-❌ "To open Notepad: open_app notepad" - USE MOUSE INSTEAD!
-
-NOW: Look at the image, analyze the situation, think about the best approach, then respond with your thinking + JSON."""
+                # Unchanged frame after a non-navigation step: skip the vision
+                # encoder and remind the model what it saw on this exact frame
+                cached_observation = None
+                if step and not screen_changed and last_action_type not in _NAVIGATION_ACTIONS:
+                    cached_observation = self._vision_cache.get(frame_hash)
+                if cached_observation:
+                    prompt = _UNCHANGED_SCREEN_NOTE.format(observation=cached_observation) + prompt
                 
                 # Clear overlay and prepare for streaming tokens
                 if self.overlay:
@@ -1115,24 +2132,27 @@ NOW: Look at the image, analyze the situation, think about the best approach, th
                     execution_log.append(f"Step {step + 1}: No model selected")
                     break
                 
-                # Detect if using qwen3-vl (doesn't support streaming)
-                use_streaming = "qwen3-vl" not in self.current_model.lower()
+                # qwen3-vl doesn't support streaming; decided once in set_model
+                use_streaming = self._use_streaming
                 
                 # Enable streaming to show tokens as they're generated (except qwen3-vl)
                 # Optimized for speed with lower temperature and shorter context
                 payload = {
                     "model": self.current_model,
+                    "system": instructions,
                     "prompt": prompt,
-                    "images": [screenshot_base64],
-                    "stream": use_streaming
+                    "stream": use_streaming,
+                    "keep_alive": self.keep_alive  # Keep the vision model resident between steps and tasks
                 }
                 
+                if not cached_observation:
+                    payload["images"] = [screenshot_base64]
+                
                 # Add options only for non-qwen3-vl models
                 if use_streaming:
                     payload["options"] = {
                         "num_ctx": 2048,  # Smaller context for faster generation
                         "num_gpu": 99,
-                        "num_thread": 4,
                         "numa": False,
                         "temperature": 0.3,  # Lower temperature for more focused, faster responses
                         "top_p": 0.9,
@@ -1140,22 +2160,25 @@ NOW: Look at the image, analyze the situation, think about the best approach, th
                         "num_predict": 512  # Limit max tokens for faster responses
                     }
                 
-                logging.info(f"[Agent] Sending request to Ollama...")
-                logging.info(f"[Agent] Model: {self.current_model}")
-                logging.info(f"[Agent] Prompt length: {len(prompt)} chars")
-                logging.info(f"[Agent] Screenshot size: {len(screenshot_base64)} bytes")
-                logging.info(f"[Agent] Streaming enabled: {use_streaming}")
+                # Per-step diagnostics use lazy %-formatting: the web app runs
+                # with the root logger at ERROR, so these are normally dropped
+                logging.info("[Agent] Sending request to Ollama...")
+                logging.info("[Agent] Model: %s", self.current_model)
+                logging.info("[Agent] Prompt length: %d chars (~%d tokens), system prompt ~%d tokens",
+                             len(prompt), len(prompt) // 4, len(instructions) // 4)
+                if cached_observation:
+                    logging.info("[Agent] Screen unchanged - sending text-only request")
+                else:
+                    logging.info("[Agent] Screenshot size: %d bytes", len(screenshot_base64))
+                logging.info("[Agent] Streaming enabled: %s", use_streaming)
                 
                 try:
-                    response = requests.post(
-                        f"{self.ollama.base_url}/api/generate",
-                        json=payload,
-                        timeout=60,
-                        stream=use_streaming  # Disable streaming for qwen3-vl
-                    )
+                    # Streams unless use_streaming is off (qwen3-vl)
+                    response = self.ollama.open_generate(payload, timeout=self.REQUEST_TIMEOUT)
                     
-                    logging.info(f"[Agent] Response status: {response.status_code}")
-                    logging.info(f"[Agent] Response headers: {dict(response.headers)}")
+                    logging.info("[Agent] Response status: %d", response.status_code)
+                    if logging.getLogger().isEnabledFor(logging.DEBUG):
+                        logging.debug("[Agent] Response headers: %s", dict(response.headers))
                     
                     if response.status_code == 200:
                         if use_streaming:
@@ -1169,33 +2192,36 @@ NOW: Look at the image, analyze the situation, think about the best approach, th
                         else:
                             # Non-streaming response (qwen3-vl)
                             logging.info("[Agent] Non-streaming response received (qwen3-vl)")
-                            response_json = response.json()
-                            logging.info(f"[Agent] Response JSON keys: {response_json.keys()}")
+                            response_json = _json_loads(response.content)
+                            logging.debug("[Agent] Response JSON keys: %s", response_json.keys())
                             response_text = response_json.get('response', '')
                             thinking = response_json.get('thinking', '')
-                            logging.info(f"[Agent] Got {len(response_text)} chars from 'response' field")
-                            logging.info(f"[Agent] Got {len(thinking)} chars from 'thinking' field")
+                            logging.info("[Agent] Got %d chars from 'response' field", len(response_text))
+                            logging.info("[Agent] Got %d chars from 'thinking' field", len(thinking))
                             if thinking and not response_text:
                                 logging.warning("[Agent] Using 'thinking' field instead of 'response'")
                                 response_text = thinking
                             result = {"success": True, "response_text": response_text, "streaming": False}
                     else:
                         error_msg = f"HTTP {response.status_code}: {response.text}"
-                        logging.error(f"[Agent] Ollama error: {error_msg}")
+                        logging.error("[Agent] Ollama error: %s", error_msg)
                         result = {"success": False, "error": error_msg}
                 except Exception as e:
-                    logging.error(f"[Agent] Request exception: {e}")
-                    import traceback
+                    logging.error("[Agent] Request exception: %s", e)
                     traceback.print_exc()
                     result = {"success": False, "error": str(e)}
                 
                 if not result["success"]:
                     execution_log.append(f"Step {step + 1}: AI generation failed: {result.get('error')}")
-                    logging.error(f"AI generation failed: {result.get('error')}")
+                    logging.error("AI generation failed: %s", result.get('error'))
                     break
                 
                 # Handle streaming vs non-streaming responses
                 response_text = ""
+                parser = _ActionPlanParser()
+                detecting = False  # The streamed plan is a detect_ui_element
+                detect_future: Optional[Future] = None  # Detection started before the plan finished
+                detect_query = None
                 
                 if result.get("streaming"):
                     # Stream tokens and accumulate response
@@ -1203,162 +2229,122 @@ NOW: Look at the image, analyze the situation, think about the best approach, th
                     
                     if not streaming_response:
                         logging.error("[Agent] No streaming response received")
-                        logging.error(f"[Agent] Result contents: {result}")
+                        logging.error("[Agent] Result contents: %s", result)
                         execution_log.append(f"Step {step + 1}: No response from AI")
                         break
                     
-                    logging.info(f"[Agent] Starting to stream tokens from: {type(streaming_response)}")
+                    logging.debug("[Agent] Starting to stream tokens from: %s", type(streaming_response))
+                    self._active_response = streaming_response
                     token_count = 0
-                    lines_processed = 0
+                    tokens = []
+                    done = False
+                    watchdog = _StreamWatchdog(streaming_response, self.STREAM_STALL_TIMEOUT)
+                    # Per-token calls bound once for the reader loop
+                    heartbeat, keep_token, feed_plan = watchdog.feed, tokens.append, parser.feed
                     
                     try:
-                        for line in streaming_response.iter_lines():
-                            lines_processed += 1
-                            
+                        # iter_stream decodes each NDJSON line with orjson when
+                        # available and stops at the done chunk
+                        for chunk in self.ollama.iter_stream(streaming_response):
                             if self.cancel_requested:
                                 break
                             
-                            if line:
-                                try:
-                                    decoded_line = line.decode('utf-8')
-                                    # Log first few raw lines for debugging
-                                    if lines_processed <= 2:
-                                        logging.info(f"[Agent] Raw line {lines_processed}: {decoded_line[:200]}")
-                                    
-                                    chunk = json.loads(decoded_line)
-                                    
-                                    # Debug: log first chunk structure
-                                    if token_count == 0:
-                                        logging.info(f"[Agent] First chunk keys: {chunk.keys()}")
-                                    
-                                    # Handle different model response formats
-                                    token = None
-                                    if 'response' in chunk and chunk['response']:
-                                        token = chunk['response']
-                                    elif 'thinking' in chunk and chunk['thinking']:
-                                        # qwen3-vl puts output in 'thinking' field
-                                        token = chunk['thinking']
-                                    
-                                    if token:
-                                        response_text += token
-                                        token_count += 1
-                                        
-                                        # Show token in overlay immediately
-                                        if self.overlay:
-                                            self.overlay.append_token(token)
-                                        
-                                        # Log first few tokens for debugging
-                                        if token_count <= 3:
-                                            logging.info(f"[Agent] Token {token_count}: '{token}'")
-                                            
-                                    # Check if generation is done
-                                    if chunk.get('done', False):
-                                        logging.info(f"[Agent] Streaming complete. Total tokens: {token_count}, Lines: {lines_processed}")
-                                        break
-                                except json.JSONDecodeError as e:
-                                    logging.warning(f"Failed to parse streaming chunk: {line[:100]}")
-                                    continue
-                            else:
-                                # Empty line received
-                                if lines_processed <= 5:
-                                    logging.debug(f"[Agent] Empty line at position {lines_processed}")
+                            # Handle different model response formats; qwen3-vl
+                            # puts output in 'thinking' field
+                            token = chunk.get('response') or chunk.get('thinking')
+                            if token:
+                                heartbeat()
+                                keep_token(token)
+                                token_count += 1
+                                plan = feed_plan(token)
+                                
+                                # Run the detection as soon as the query is known;
+                                # OpenCV releases the GIL, so it overlaps the rest
+                                # of the generation
+                                if not detecting and parser.action == "detect_ui_element":
+                                    detecting = True
+                                if detecting and detect_future is None and frame is not None:
+                                    detect_query = parser.element_name
+                                    if detect_query:
+                                        detect_future = capture_pool.submit(self._detect_cached, frame, detect_query)
+                                
+                                # Show token in overlay without blocking the reader
+                                if token_pump:
+                                    token_pump.put(token)
+                                
+                                if plan is not None:
+                                    # The plan is complete: drop the connection so
+                                    # Ollama stops generating trailing text
+                                    streaming_response.close()
+                                    done = True
+                                    logging.info("[Agent] Action plan complete after %d tokens, stopping generation", token_count)
+                                    break
+                            
+                            done = chunk.get('done', False)
                         
-                        # Log if loop completed without any lines
-                        if lines_processed == 0:
-                            logging.error("[Agent] No lines received from streaming response!")
+                        if self.cancel_requested:
+                            # Never act on a half-generated plan
+                            continue
+                        if watchdog.stalled:
+                            raise TimeoutError(f"no token for {self.STREAM_STALL_TIMEOUT:.0f}s")
+                        response_text = "".join(tokens)
+                        if done:
+                            logging.info("[Agent] Streaming complete. Total tokens: %d", token_count)
+                        elif token_count == 0:
+                            logging.error("[Agent] No tokens received from streaming response!")
                             
                     except Exception as e:
-                        logging.error(f"Streaming error: {e}")
-                        import traceback
+                        if self.cancel_requested:
+                            # cancel_operation closed the response under us;
+                            # the cancel check at the top of the loop reports it
+                            continue
+                        if watchdog.stalled:
+                            # Retry the step with a fresh screenshot and request
+                            logging.warning("[Agent] Stream stalled after %d tokens, retrying step", token_count)
+                            execution_log.append(f"Step {step + 1}: Model stream stalled, retrying")
+                            screen_dirty = True
+                            continue
+                        logging.error("Streaming error: %s", e)
                         traceback.print_exc()
                         execution_log.append(f"Step {step + 1}: Streaming failed: {str(e)}")
                         break
+                    finally:
+                        watchdog.stop()
+                        self._active_response = None
+                        if token_pump:
+                            token_pump.flush()
                 else:
                     # Non-streaming (qwen3-vl) - already have response_text
                     response_text = result.get("response_text", "")
-                    logging.info(f"[Agent] Non-streaming response: {len(response_text)} chars")
+                    parser.parse(response_text)
+                    logging.info("[Agent] Non-streaming response: %d chars", len(response_text))
                     if self.overlay:
                         self.overlay.append_token(response_text)  # Show full response at once
                 
                 response_text = response_text.strip()
                 
                 if not response_text:
-                    logging.error(f"[Agent] AI returned empty response")
+                    logging.error("[Agent] AI returned empty response")
                     execution_log.append(f"Step {step + 1}: AI returned empty response")
                     break
                 
-                logging.info(f"[Agent] Full AI Response ({len(response_text)} chars): {response_text[:500]}...")
+                if logging.getLogger().isEnabledFor(logging.INFO):
+                    logging.info("[Agent] Full AI Response (%d chars): %s...", len(response_text), response_text[:500])
                 
-                # Try to extract JSON from response (may contain thinking text before JSON)
-                import re
+                # Extract the JSON plan (may follow thinking text or be cut off)
+                action_plan = parser.finish()
+                if action_plan is None:
+                    # AI didn't provide valid JSON, log what we got
+                    logging.error("Invalid AI response (no JSON found): %s", response_text[:500])
+                    execution_log.append(f"Step {step + 1}: Invalid AI response format")
+                    execution_log.append(f"  AI said: {response_text[:200] if response_text else '(empty)'}...")
+                    break
                 
-                # First try to find JSON in code blocks (improved regex that handles nested content)
-                json_block_match = re.search(r'```json\s*(\{.*?\})\s*```', response_text, re.DOTALL)
-                if json_block_match:
-                    json_text = json_block_match.group(1)
-                else:
-                    # Try finding JSON without code block markers
-                    # Look for pattern starting with { and ending with }, allowing nested braces
-                    json_start = response_text.find('{')
-                    if json_start != -1:
-                        # Find the matching closing brace
-                        brace_count = 0
-                        in_string = False
-                        escape_next = False
-                        json_end = -1
-                        
-                        for i in range(json_start, len(response_text)):
-                            char = response_text[i]
-                            
-                            if escape_next:
-                                escape_next = False
-                                continue
-                            
-                            if char == '\\':
-                                escape_next = True
-                                continue
-                            
-                            if char == '"' and not in_string:
-                                in_string = True
-                            elif char == '"' and in_string:
-                                in_string = False
-                            elif char == '{' and not in_string:
-                                brace_count += 1
-                            elif char == '}' and not in_string:
-                                brace_count -= 1
-                                if brace_count == 0:
-                                    json_end = i + 1
-                                    break
-                        
-                        if json_end != -1:
-                            json_text = response_text[json_start:json_end]
-                        else:
-                            # AI didn't provide valid JSON, log what we got
-                            logging.error(f"Invalid AI response (no JSON found): {response_text[:500]}")
-                            execution_log.append(f"Step {step + 1}: Invalid AI response format")
-                            execution_log.append(f"  AI said: {response_text[:200] if response_text else '(empty)'}...")
-                            break
-                    else:
-                        # AI didn't provide valid JSON, log what we got
-                        logging.error(f"Invalid AI response (no JSON found): {response_text[:500]}")
-                        execution_log.append(f"Step {step + 1}: Invalid AI response format")
-                        execution_log.append(f"  AI said: {response_text[:200] if response_text else '(empty)'}...")
-                        break
+                # Log thinking if present
+                if "observation" in action_plan:
+                    logging.info("[Agent] AI Observation: %s", action_plan['observation'])
                 
-                try:
-                    action_plan = json.loads(json_text)
-                    
-                    # Log thinking if present
-                    if "observation" in action_plan:
-                        logging.info(f"[Agent] AI Observation: {action_plan['observation']}")
-                    
-                    logging.info(f"[Agent] Parsed action: {action_plan}")
-                except json.JSONDecodeError as e:
-                    logging.error(f"JSON parse error: {e}")
-                    logging.error(f"Attempted to parse: {json_text[:200]}")
-                    execution_log.append(f"Step {step + 1}: Could not parse AI response")
-                    execution_log.append(f"  JSON found: {json_text[:100]}...")
-                    break
+                logging.info("[Agent] Parsed action: %s", action_plan)
                 
                 action_type = action_plan.get("action", "").lower()
                 reasoning = action_plan.get("reasoning", "")
@@ -1369,44 +2355,61 @@ NOW: Look at the image, analyze the situation, think about the best approach, th
                 # Log observation if present
                 if observation:
                     execution_log.append(f"  👁️ AI sees: {observation[:100]}")
+                    if frame_hash is not None and not cached_observation:
+                        self._vision_cache[frame_hash] = observation
+                        if len(self._vision_cache) > 64:
+                            del self._vision_cache[next(iter(self._vision_cache))]
+                last_action_type = action_type
                 
-                # Detect action loops (same action repeating)
-                current_action = f"{action_type}_{parameters.get('app', parameters.get('text', ''))}"
-                if current_action == last_action:
-                    repeat_count += 1
-                    if repeat_count >= 3:
-                        logging.warning(f"[Agent] Detected action loop: {action_type} repeated {repeat_count} times")
-                        execution_log.append(f"⚠ Warning: Action '{action_type}' repeated {repeat_count} times - AI may be stuck")
-                        
-                        # Generic auto-recovery: if stuck opening app, suggest moving on
-                        if action_type == "open_app" and repeat_count >= 3:
-                            logging.info(f"[Agent] Stuck opening app - it may already be open or failing to launch")
-                            execution_log.append(f"⚠ App might already be open or unavailable - AI should check screen and adapt")
-                        
-                        # Break at 5 repetitions for any action type
-                        if repeat_count >= 5:
-                            logging.error(f"[Agent] Breaking out of infinite loop at step {step + 1}")
-                            execution_log.append(f"❌ Stopped: AI stuck in loop repeating '{action_type}' - task may be impossible or complete")
-                            break
-                else:
-                    repeat_count = 0
-                    last_action = current_action
+                # Navigation steps get a smaller frame; go back to the analyzer's
+                # max_dimension when the model is homing in on an element or
+                # trying to read detail (detection itself always runs unscaled)
+                needs_detail = action_type == "detect_ui_element" or _DETAIL_HINT_RE.search(str(observation))
+                capture_dimension = None if needs_detail else self.NAVIGATION_MAX_DIMENSION
+                
+                # Detect action loops: the same action and parameters recurring in
+                # the recent window, whether back to back or in an A-B-A-B cycle
+                param_items = parameters.items() if isinstance(parameters, dict) else ()
+                action_key = hash((action_type, tuple(sorted((k, str(v)) for k, v in param_items))))
+                recent_actions.append(action_key)
+                repeat_count = recent_actions.count(action_key)
+                if repeat_count >= 3:
+                    logging.warning("[Agent] Detected action loop: %s repeated %d times", action_type, repeat_count)
+                    execution_log.append(f"⚠ Warning: Action '{action_type}' repeated {repeat_count} times - AI may be stuck")
+                    
+                    # Generic auto-recovery: if stuck opening app, suggest moving on
+                    if action_type == "open_app":
+                        logging.info("[Agent] Stuck opening app - it may already be open or failing to launch")
+                        execution_log.append(f"⚠ App might already be open or unavailable - AI should check screen and adapt")
+                    
+                    # Break at 5 repetitions within the window for any action type
+                    if repeat_count >= 5:
+                        logging.error("[Agent] Breaking out of infinite loop at step %d", step + 1)
+                        execution_log.append(f"❌ Stopped: AI stuck in loop repeating '{action_type}' - task may be impossible or complete")
+                        break
                 
                 execution_log.append(f"Step {step + 1}: {action_type} - {reasoning}")
-                logging.info(f"[Agent] Step {step + 1}: {action_type} - {reasoning}")
+                logging.info("[Agent] Step %d: %s - %s", step + 1, action_type, reasoning)
                 
                 # Store action context for next iteration
                 action_result = None
                 
                 # Execute the action if auto_execute is enabled
                 if auto_execute:
+                    spec = self._action_table.get(action_type)
+                    # Baseline for the post-action wait; settle is the longest the
+                    # UI is given to react
+                    pre_action_hash = self.screen_analyzer.fingerprint() if action_type in _NAVIGATION_ACTIONS else None
+                    settle = 0.0
+                    settle_blind = False
+                    input_sent = None  # False once an input action is known to have done nothing
                     if action_type == "complete" or task_complete:
                         execution_log.append("Task completed successfully!")
                         return {
                             "success": True,
                             "task": task,
                             "steps_completed": steps_completed,
-                            "execution_log": execution_log,
+                            "execution_log": list(execution_log),
                             "message": "Task completed!"
                         }
                     
@@ -1420,7 +2423,12 @@ NOW: Look at the image, analyze the situation, think about the best approach, th
                             if self.overlay:
                                 self.overlay.update_reasoning(f"🔍 Detecting UI element: {element_name}...")
                             
-                            elements = self.ui_detector.detect_elements(screenshot_base64, element_query=element_name)
+                            if detect_future is not None and detect_query == element_name:
+                                elements = detect_future.result()
+                            elif frame is not None:
+                                elements = self._detect_cached(frame, element_name)
+                            else:
+                                elements = []
                             
                             if elements and len(elements) > 0:
                                 elem = elements[0]
@@ -1436,8 +2444,13 @@ NOW: Look at the image, analyze the situation, think about the best approach, th
                                     duration=0.5
                                 )
                                 
+                                # Report the position in pixels of the next screenshot,
+                                # the coordinate space the model answers in
+                                image_x, image_y = self.screen_analyzer.to_image_coords(
+                                    elem['x'], elem['y'], self.screen_analyzer.scale_for(capture_dimension)
+                                )
                                 if move_result["success"]:
-                                    action_result = f"✓ Found '{elem['name']}' at ({elem['x']}, {elem['y']}) and moved mouse there"
+                                    action_result = f"✓ Found '{elem['name']}' at ({image_x}, {image_y}) in the next screenshot and moved mouse there"
                                     execution_log.append(f"✓ Detected: {elem['name']} at ({elem['x']}, {elem['y']})")
                                     execution_log.append(f"✓ Moved mouse to ({elem['x']}, {elem['y']})")
                                     
@@ -1445,7 +2458,7 @@ NOW: Look at the image, analyze the situation, think about the best approach, th
                                     if self.overlay:
                                         self.overlay.update_reasoning(f"✓ Found {elem['name']} at ({elem['x']}, {elem['y']}) - Mouse moved!")
                                 else:
-                                    action_result = f"✓ Found '{elem['name']}' at ({elem['x']}, {elem['y']}) but mouse move failed"
+                                    action_result = f"✓ Found '{elem['name']}' at ({image_x}, {image_y}) in the next screenshot but mouse move failed"
                                     execution_log.append(f"✓ Detected: {elem['name']} at ({elem['x']}, {elem['y']})")
                                     execution_log.append(f"  Warning: Mouse move failed - {move_result.get('error', 'unknown error')}")
                             else:
@@ -1454,178 +2467,92 @@ NOW: Look at the image, analyze the situation, think about the best approach, th
                                 if self.overlay:
                                     self.overlay.update_reasoning(f"❌ Could not find '{element_name}'")
                     
-                    elif action_type == "mouse_click":
-                        result = self.task_executor.execute_mouse_click(
-                            parameters.get("x", 0),
-                            parameters.get("y", 0),
-                            parameters.get("button", "left")
-                        )
-                        if result["success"]:
-                            steps_completed += 1
-                            action_result = f"Clicked at ({parameters.get('x', 0)}, {parameters.get('y', 0)})"
-                            time.sleep(0.5)  # Brief pause after click
-                        else:
-                            action_result = f"Failed: {result['error']}"
-                            execution_log.append(f"  Error: {result['error']}")
-                    
-                    elif action_type == "keyboard_type":
-                        result = self.task_executor.execute_keyboard_type(
-                            parameters.get("text", "")
-                        )
+                    elif spec is not None:
+                        # Table-driven actions: pull parameters, run, settle
+                        result, args = self._run_table_action(spec, parameters, frame_scale)
+                        input_sent = result["success"]
                         if result["success"]:
                             steps_completed += 1
-                            text_preview = parameters.get('text', '')[:50]
-                            action_result = f"Typed: {text_preview}"
-                            execution_log.append(f"✓ Typed: {parameters.get('text', '')}")
-                            time.sleep(0.3)
+                            if spec.result:
+                                action_result = spec.result.format(**args)
+                            if spec.log:
+                                execution_log.append(spec.log.format(**args))
+                            settle, settle_blind = spec.settle, spec.blind
                         else:
                             action_result = f"Failed: {result['error']}"
                             execution_log.append(f"  Error: {result['error']}")
                     
-                    elif action_type == "key_press":
-                        result = self.task_executor.execute_key_press(
-                            parameters.get("key", "")
-                        )
-                        if result["success"]:
-                            steps_completed += 1
-                            time.sleep(0.3)
+                    elif action_type == "chain":
+                        # Several table actions in one step: only the last one is
+                        # followed by the usual wait and a new screenshot
+                        sub_steps = parameters.get("steps") if isinstance(parameters, dict) else None
+                        if not isinstance(sub_steps, list) or not sub_steps:
+                            input_sent = False
+                            action_result = "Failed: chain needs a non-empty steps list"
+                            execution_log.append("  Error: chain needs a non-empty steps list")
                         else:
-                            execution_log.append(f"  Error: {result['error']}")
-                    
-                    elif action_type == "hotkey":
-                        keys = parameters.get("keys", [])
-                        if isinstance(keys, list) and keys:
-                            result = self.task_executor.execute_hotkey(*keys)
-                            if result["success"]:
-                                steps_completed += 1
-                                time.sleep(0.5)
-                            else:
-                                execution_log.append(f"  Error: {result['error']}")
-                        else:
-                            execution_log.append(f"  Error: Invalid hotkey parameters")
-                    
-                    elif action_type == "open_app":
-                        app = parameters.get("app", "")
-                        if app:
-                            result = self.task_executor.open_application(app)
-                            if result["success"]:
+                            outcomes = []
+                            input_sent = False
+                            sub_steps = sub_steps[:self.MAX_CHAIN_STEPS]
+                            for index, sub in enumerate(sub_steps, 1):
+                                sub = sub if isinstance(sub, dict) else {}
+                                sub_type = str(sub.get("action", "")).lower()
+                                sub_spec = self._action_table.get(sub_type)
+                                if sub_spec is None:
+                                    outcomes.append(f"stopped at {index}: unsupported action '{sub_type}'")
+                                    execution_log.append(f"  Error: chain step {index}: unsupported action '{sub_type}'")
+                                    break
+                                sub_hash = self.screen_analyzer.fingerprint() if index < len(sub_steps) else None
+                                result, args = self._run_table_action(sub_spec, sub.get("parameters") or {}, frame_scale)
+                                if not result["success"]:
+                                    outcomes.append(f"{sub_type} failed: {result['error']}")
+                                    execution_log.append(f"  Error: chain step {index} ({sub_type}): {result['error']}")
+                                    break
                                 steps_completed += 1
-                                action_result = f"Opened {app} successfully"
-                                logging.info(f"[Agent] Successfully opened: {app}")
-                                execution_log.append(f"  ✓ Opened {app}")
-                                time.sleep(1.5)  # Give app time to open
-                            else:
-                                action_result = f"Failed to open {app}: {result['error']}"
-                                logging.error(f"[Agent] Failed to open {app}: {result['error']}")
-                                execution_log.append(f"  Error: {result['error']}")
-                        else:
-                            action_result = "Failed: No app specified"
-                            execution_log.append(f"  Error: No app specified")
-                    
-                    elif action_type == "mouse_move":
-                        result = self.task_executor.execute_mouse_move(
-                            parameters.get("x", 0),
-                            parameters.get("y", 0)
-                        )
-                        if result["success"]:
-                            steps_completed += 1
-                            time.sleep(0.2)
-                        else:
-                            execution_log.append(f"  Error: {result['error']}")
-                    
-                    elif action_type == "double_click":
-                        result = self.task_executor.execute_double_click(
-                            parameters.get("x", 0),
-                            parameters.get("y", 0)
-                        )
-                        if result["success"]:
-                            steps_completed += 1
-                            time.sleep(0.5)
-                        else:
-                            execution_log.append(f"  Error: {result['error']}")
-                    
-                    elif action_type == "right_click":
-                        result = self.task_executor.execute_right_click(
-                            parameters.get("x", 0),
-                            parameters.get("y", 0)
-                        )
-                        if result["success"]:
-                            steps_completed += 1
-                            time.sleep(0.5)
-                        else:
-                            execution_log.append(f"  Error: {result['error']}")
-                    
-                    elif action_type == "escape":
-                        result = self.task_executor.execute_escape()
-                        if result["success"]:
-                            steps_completed += 1
-                            time.sleep(0.3)
-                        else:
-                            execution_log.append(f"  Error: {result['error']}")
-                    
-                    elif action_type == "ctrl_n":
-                        result = self.task_executor.execute_ctrl_n()
-                        if result["success"]:
-                            steps_completed += 1
-                            time.sleep(0.7)
-                        else:
-                            execution_log.append(f"  Error: {result['error']}")
-                    
-                    elif action_type == "select_all":
-                        result = self.task_executor.execute_select_all()
-                        if result["success"]:
-                            steps_completed += 1
-                            time.sleep(0.2)
-                        else:
-                            execution_log.append(f"  Error: {result['error']}")
-                    
-                    elif action_type == "save_file":
-                        result = self.task_executor.execute_save_file()
-                        if result["success"]:
-                            steps_completed += 1
-                            time.sleep(0.3)
-                        else:
-                            execution_log.append(f"  Error: {result['error']}")
-                    
-                    elif action_type == "alt_tab":
-                        result = self.task_executor.execute_alt_tab()
-                        if result["success"]:
-                            steps_completed += 1
-                            time.sleep(0.5)
-                        else:
-                            execution_log.append(f"  Error: {result['error']}")
-                    
-                    elif action_type == "scroll":
-                        result = self.task_executor.execute_scroll(
-                            parameters.get("amount", 3)
-                        )
-                        if result["success"]:
-                            steps_completed += 1
-                            time.sleep(0.3)
-                        else:
-                            execution_log.append(f"  Error: {result['error']}")
+                                input_sent = True
+                                outcomes.append(sub_spec.result.format(**args) if sub_spec.result else sub_type)
+                                if sub_spec.log:
+                                    execution_log.append(sub_spec.log.format(**args))
+                                settle, settle_blind = sub_spec.settle, sub_spec.blind
+                                if sub_hash is not None and settle:
+                                    # Let this action land before sending the next one
+                                    self._wait_for_screen_change(
+                                        sub_hash, timeout=settle, min_wait=settle if settle_blind else 0.05
+                                    )
+                            action_result = "Chain: " + "; ".join(outcomes)
                     
                     elif action_type == "wait":
                         wait_time = parameters.get("seconds", 1)
                         time.sleep(wait_time)
+                        last_wait, wait_replays = wait_time, 0
                         execution_log.append(f"  Waited {wait_time} seconds")
                     
                     else:
                         action_result = f"Unknown action: {action_type}"
                         execution_log.append(f"  Unknown action type: {action_type}")
                     
+                    # Unknown actions and input actions that failed (e.g. permission
+                    # denied) left the screen alone; the next step reuses this frame
+                    screen_dirty = action_type in _SCREEN_ACTIONS and input_sent is not False
+                    
                     # Save this step to context for next iteration
-                    task_context.append({
-                        "step": step + 1,
-                        "action": action_type,
-                        "reasoning": reasoning,
-                        "observation": observation,
-                        "result": action_result
-                    })
+                    task_context.append((action_type, reasoning, action_result))
                     
                     # Overlay already hidden before action execution above
-                    # Wait for screen to update after action
-                    time.sleep(0.5)
+                    # Wait for screen to update after action (returning as soon
+                    # as the redraw settles), then start grabbing the next frame
+                    if screen_dirty:
+                        if pre_action_hash is not None:
+                            min_wait = settle if settle_blind else 0.05
+                            self._wait_for_screen_change(pre_action_hash, timeout=settle + 0.5, min_wait=min_wait)
+                            # The poll's last grab is the settled screen; encode it
+                            # rather than grabbing a second time
+                            next_capture = capture_pool.submit(
+                                self._capture_step_screenshot, self.SETTLED_GRAB_MAX_AGE, capture_dimension
+                            )
+                        else:
+                            time.sleep(0.5)
+                            next_capture = capture_pool.submit(self._capture_step_screenshot, 0.0, capture_dimension)
                 
                 else:
                     # Manual mode - return the plan for user confirmation
@@ -1633,7 +2560,7 @@ NOW: Look at the image, analyze the situation, think about the best approach, th
                         "success": True,
                         "task": task,
                         "action_plan": action_plan,
-                        "execution_log": execution_log,
+                        "execution_log": list(execution_log),
                         "message": "Action plan ready. Confirm to execute.",
                         "requires_confirmation": True
                     }
@@ -1643,79 +2570,119 @@ NOW: Look at the image, analyze the situation, think about the best approach, th
                 "success": True,
                 "task": task,
                 "steps_completed": steps_completed,
-                "execution_log": execution_log,
+                "execution_log": list(execution_log),
                 "message": f"Task execution stopped after {max_steps} steps. May need manual completion."
             }
             
         except Exception as e:
-            logging.error(f"[Agent] Task execution error: {e}")
+            logging.error("[Agent] Task execution error: %s", e)
             result = {
                 "success": False,
                 "error": str(e),
-                "execution_log": execution_log
+                "execution_log": list(execution_log)
             }
         
         finally:
+            capture_pool.shutdown(wait=True)
+            if token_pump:
+                token_pump.close()
+            
             # STOP overlay completely when done
             if self.overlay:
                 self.overlay.update_reasoning("")
                 self.overlay.stop()  # Completely stop the overlay window
             
-            # Unload model from memory to prevent lag
-            if self.current_model:
-                logging.info("Unloading model to free memory...")
-                self.ollama.unload_model(self.current_model)
+            # The model stays loaded so a follow-up task skips the reload;
+            # Ollama evicts it after keep_alive idle, shutdown() at exit
             
             # Clean up old screenshots (keep last 10)
             self.screen_analyzer.cleanup_old_screenshots(keep_last=10)
             
-            # Force garbage collection
-            import gc
-            gc.collect()
+            # Collect garbage only if this task left the process noticeably larger
+            self._collect_if_grown()
         
         return result
     
-    def chat(self, message: str, include_screen: bool = False) -> Dict:
-        """Chat with agent, optionally including screen context"""
-        if not self.current_model:
-            return {"success": False, "error": "No model selected"}
+    def _prepare_chat(self, message: str, include_screen: bool) -> Tuple[Dict, List[Dict], Optional[List[str]], Optional[str]]:
+        """Build the user message, request history and optional screenshot for a chat turn
         
-        # Build message
+        The last item is the attached screenshot's file name, None if no
+        screenshot was requested or the capture failed.
+        """
         user_message = {"role": "user", "content": message}
-        messages = self.conversation_history + [user_message]
+        messages = [*self.conversation_history, user_message]
         
         # Optionally include screen
         images = None
+        screenshot_name = None
         if include_screen:
             screenshot_base64 = self.screen_analyzer.capture_screen()
             if screenshot_base64:
                 images = [screenshot_base64]
+                screenshot_name = self.screen_analyzer.last_screenshot.name
                 user_message["content"] += " [Screen included]"
+        return user_message, messages, images, screenshot_name
+    
+    def _record_chat(self, user_message: Dict, response: str):
+        self.conversation_history.append(user_message)
+        self.conversation_history.append({
+            "role": "assistant",
+            "content": response,
+            "timestamp": datetime.now().isoformat()
+        })
+    
+    def chat(self, message: str, include_screen: bool = False) -> Dict:
+        """Chat with agent, optionally including screen context"""
+        if not self.current_model:
+            return {"success": False, "error": "No model selected"}
+        
+        user_message, messages, images, screenshot_name = self._prepare_chat(message, include_screen)
         
         # Get response from Ollama
         result = self.ollama.chat(
             model=self.current_model,
             messages=messages,
-            images=images
+            images=images,
+            keep_alive=self.keep_alive
         )
         
         if result["success"]:
             # Add to history
-            self.conversation_history.append(user_message)
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": result["response"],
-                "timestamp": datetime.now().isoformat()
-            })
+            self._record_chat(user_message, result["response"])
             
             return {
                 "success": True,
                 "response": result["response"],
-                "screenshot": self.screen_analyzer.last_screenshot.name if include_screen else None
+                "screenshot": screenshot_name
             }
         else:
             return result
     
+    def chat_stream(self, message: str, include_screen: bool = False):
+        """Streaming variant of chat(): yields event dicts for server-sent events
+        
+        Yields ``{"token": ...}`` per content fragment, then a final
+        ``{"done": True, "screenshot": ...}`` or ``{"error": ...}``.
+        """
+        if not self.current_model:
+            yield {"error": "No model selected"}
+            return
+        
+        user_message, messages, images, screenshot_name = self._prepare_chat(message, include_screen)
+        
+        parts = []
+        try:
+            for token in self.ollama.chat_stream(self.current_model, messages, images=images, keep_alive=self.keep_alive):
+                parts.append(token)
+                yield {"token": token}
+        except Exception as e:
+            logging.error("Chat stream failed: %s", e)
+            yield {"error": str(e)}
+            return
+        
+        self._record_chat(user_message, "".join(parts))
+        yield {"done": True, "screenshot": screenshot_name}
+    
     def set_permissions(self, permissions: Dict) -> Dict:
         """Set agent permissions"""
         for action_type, granted in permissions.items():
@@ -1740,8 +2707,8 @@ NOW: Look at the image, analyze the situation, think about the best approach, th
     
     def clear_history(self):
         """Clear conversation history"""
-        self.conversation_history = []
-        self.task_executor.action_history = []
+        self.conversation_history.clear()
+        self.task_executor.action_history.clear()
         return {"success": True, "message": "History cleared"}
     
     def execute_action(self, action: Dict) -> Dict:
@@ -3,7 +3,11 @@ import torch
 import psutil
 import os
 import logging
-from transformers import pipeline
+import queue
+import threading
+import importlib.util
+from concurrent.futures import Future
+from transformers import AutoModelForCausalLM, BitsAndBytesConfig, StoppingCriteria, StoppingCriteriaList, pipeline
 from config import LLM_MODEL_ID, GENERATION_ARGS, INITIAL_GEN_ARGS
 
 try:
@@ -11,9 +15,47 @@ try:
 except ImportError:
     ENABLE_HISTORY_SEARCH = True  # Default to enabled if not configured
 
+try:
+    from config import ASSISTANT_MODEL_ID
+except ImportError:
+    ASSISTANT_MODEL_ID = None  # Speculative decoding off if not configured
+
+try:
+    from config import LLM_QUANT
+except ImportError:
+    LLM_QUANT = None  # Full-precision weights if not configured
+
 # Detect physical cores for optimal threading
 PHYSICAL_CORES = psutil.cpu_count(logical=False) or 4
 
+# Prompt lengths are left-padded up to one of these so the compiled graph is
+# reused across turns instead of recompiling for every new length
+PROMPT_BUCKETS = (128, 256, 512, 1024, 2048, 4096)
+
+# Tokens decoded per warmup pass: enough to compile and capture the decode step
+WARMUP_NEW_TOKENS = 8
+
+# Most conversations decoded together in one generate call. Decode reads all
+# weights once per step whatever the batch, so a few rows cost about as much as one.
+# Eager mode only: the compiled forward is specialised (dynamic=False, static
+# cache, CUDA graphs) to the batch-1 shapes warmed up at load
+MAX_BATCH_SIZE = 4
+
+
+class _StopAtLength(StoppingCriteria):
+    """Stop generation at a fixed total length (warmup only).
+
+    max_new_tokens also sizes the static KV cache, so warmup keeps the real
+    value and stops early with this instead; the graphs it compiles then match
+    the ones real turns use.
+    """
+    def __init__(self, length):
+        self.length = length
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = input_ids.shape[1] >= self.length
+        return torch.full((input_ids.shape[0],), done, dtype=torch.bool, device=input_ids.device)
+
 class Brain:
     """
     Handles loading the Language Model and generating text responses.
@@ -21,14 +63,148 @@ class Brain:
     """
     def __init__(self, context_manager=None):
         self.context_manager = context_manager
+        self._needs_compile = False  # Set by _load_model; compiled during warmup (or first generate)
+        self._compiled = False
+        self._dtype = torch.float32  # Weight dtype chosen by _load_model
         self._setup_optimal_environment()
-        self.pipe = self._load_model()
-        self._warmup_iterations = 3
+        self.pipe = None
+        self.assistant_model = None
+        self._gen_args = {**GENERATION_ARGS, 'pad_token_id': 0}
+        self._initial_gen_args = {**INITIAL_GEN_ARGS, 'pad_token_id': 0}
+        self._warmup_iterations = 3  # Prompt buckets compiled ahead of the first turn
         self._warmed_up = False
-        self._cuda_graph = None
-        self._static_input_ids = None
-        self._static_attention_mask = None
-        self._static_output = None
+        
+        # Requests for the generation worker: (messages, initial, Future)
+        self._requests = queue.Queue()
+        self._held = None  # Request that did not fit the previous batch
+        
+        # Download, load, compile and warm up off the caller's thread, then
+        # serve generate_response from that same thread: CUDA graphs captured
+        # by torch.compile are replayed only on the thread that recorded them.
+        # generate_response waits on _ready before its first use
+        self._ready = threading.Event()
+        threading.Thread(target=self._run_worker, name="brain-worker", daemon=True).start()
+
+    def _run_worker(self):
+        """Load the model, then run queued generations (batched) until exit."""
+        self._load_and_warmup()
+        if self.pipe is None:
+            return
+        while True:
+            self._generate_batch(self._next_batch())
+
+    def _next_batch(self):
+        """Block for one request, then add any others already waiting.
+
+        Only requests that are queued right now are coalesced, so a lone user
+        never waits on a batching window. A batch shares one set of generation
+        kwargs (greeting or regular), and assisted decoding is single-row only.
+        So is the compiled model: a new batch size would recompile and capture
+        new CUDA graphs in the middle of a live turn.
+        """
+        first = self._held if self._held is not None else self._requests.get()
+        self._held = None
+        batch = [first]
+        if self.assistant_model is not None or self._compiled or self._needs_compile:
+            return batch
+        while len(batch) < MAX_BATCH_SIZE:
+            try:
+                request = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if request[1] != first[1]:
+                self._held = request
+                break
+            batch.append(request)
+        return batch
+
+    def _generate_batch(self, batch):
+        """Generate replies for a batch of (messages, initial, Future) requests."""
+        gen_args = self._initial_gen_args if batch[0][1] else self._gen_args
+        try:
+            # inference_mode skips autograd bookkeeping (version counters,
+            # view tracking) for every op in the decode loop
+            with torch.inference_mode(), self._autocast():
+                if self._needs_compile:
+                    self._compile_model()
+                # Tokenize and call generate directly rather than through the
+                # pipeline, so prompts can be padded to a bucket length
+                input_ids, attention_mask = self._prepare_inputs([messages for messages, _, _ in batch])
+                # With an assistant model the draft proposes several tokens
+                # and the main model verifies them in one forward pass
+                output_ids = self.pipe.model.generate(
+                    input_ids=input_ids,
+                    attention_mask=attention_mask,
+                    assistant_model=self.assistant_model,
+                    **gen_args
+                )
+            if len(batch) > 1:
+                logging.info(f"[brain] Generated {len(batch)} replies in one batch")
+            prompt_length = input_ids.shape[1]
+            for row, (_, _, future) in enumerate(batch):
+                future.set_result(
+                    self.pipe.tokenizer.decode(output_ids[row, prompt_length:], skip_special_tokens=True)
+                )
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+
+    def _load_and_warmup(self):
+        """Background loader: model, assistant model, generation kwargs, warmup."""
+        try:
+            self.pipe = self._load_model()
+            self.assistant_model = self._load_assistant_model()
+            
+            # Generation kwargs frozen once: the shared config dicts are never
+            # mutated and no tokenizer lookups happen per call
+            tokenizer = getattr(self.pipe, 'tokenizer', None)
+            pad_token_id = getattr(tokenizer, 'eos_token_id', None)
+            if pad_token_id is None:
+                pad_token_id = 0  # Tokenizer doesn't expose eos_token_id
+            self._gen_args = {**GENERATION_ARGS, 'pad_token_id': pad_token_id}
+            self._initial_gen_args = {**INITIAL_GEN_ARGS, 'pad_token_id': pad_token_id}
+            
+            self._warmup()
+        except Exception:
+            # _load_model has logged the cause; generate_response reports it
+            self.pipe = None
+        finally:
+            self._ready.set()
+
+    def _warmup(self):
+        """Compile the model and run short generations on the first prompt buckets.
+
+        Dynamo compilation (and CUDA graph capture) happens on the first pass
+        for each shape; doing it here keeps it off the first real turns.
+        """
+        if not self._needs_compile:
+            return  # Eager models have nothing to compile
+        messages = [{"role": "user", "content": "Hello"}]
+        try:
+            with torch.inference_mode(), self._autocast():
+                self._compile_model()
+                if not self._compiled:
+                    return
+                for bucket in PROMPT_BUCKETS[:self._warmup_iterations]:
+                    logging.info(f"[OPTIMIZER] Warmup pass for {bucket}-token prompts...")
+                    input_ids, attention_mask = self._prepare_inputs([messages], min_length=bucket)
+                    stop = StoppingCriteriaList([_StopAtLength(input_ids.shape[1] + WARMUP_NEW_TOKENS)])
+                    self.pipe.model.generate(
+                        input_ids=input_ids,
+                        attention_mask=attention_mask,
+                        assistant_model=self.assistant_model,
+                        stopping_criteria=stop,
+                        **self._gen_args
+                    )
+            self._warmed_up = True
+            logging.info("[OPTIMIZER] Warmup complete")
+        except Exception as e:
+            logging.warning(f"[OPTIMIZER] Warmup failed (first turns will compile instead): {e}")
+
+    def wait_until_ready(self, timeout=None):
+        """Block until the background load has finished; True if the model is usable."""
+        self._ready.wait(timeout)
+        return self.pipe is not None
 
     def _setup_optimal_environment(self):
         """Setup optimal PyTorch environment for 50-series GPUs."""
@@ -41,6 +217,10 @@ class Brain:
         os.environ['MKL_NUM_THREADS'] = str(PHYSICAL_CORES)
         logging.info(f"[OPTIMIZER] Thread count set to {PHYSICAL_CORES} (physical cores)")
         
+        # Let the FP32 matmuls left over after the BF16 cast (norms, logits
+        # processors) use TF32 tensor cores
+        torch.set_float32_matmul_precision('high')
+        
         if torch.cuda.is_available():
             # Enable cuDNN optimizations
             torch.backends.cudnn.benchmark = True
@@ -72,9 +252,21 @@ class Brain:
             # Check if BF16 is supported (Ampere+ GPUs)
             use_bf16 = torch.cuda.is_available() and torch.cuda.is_bf16_supported()
             dtype = torch.bfloat16 if use_bf16 else torch.float16
+            self._dtype = dtype
             
             logging.info(f"[OPTIMIZER] Using {dtype} precision")
             
+            # The attention class is chosen inside from_pretrained, so it must be
+            # requested here; PyTorch SDPA (flash/mem-efficient kernels enabled in
+            # _setup_optimal_environment) when the flash_attn package is missing
+            attn_impl = "flash_attention_2" if importlib.util.find_spec("flash_attn") else "sdpa"
+            logging.info(f"[OPTIMIZER] Attention implementation: {attn_impl}")
+            
+            model_kwargs = {"attn_implementation": attn_impl}
+            quant_config = self._quantization_config(dtype)
+            if quant_config is not None:
+                model_kwargs["quantization_config"] = quant_config
+            
             # Load pipeline with optimal settings
             pipe = pipeline(
                 "text-generation",
@@ -83,34 +275,17 @@ class Brain:
                 return_full_text=False,
                 torch_dtype=dtype,
                 low_cpu_mem_usage=True,  # Preload weights efficiently
+                model_kwargs=model_kwargs,
             )
             
-            # Disable gradient tracking everywhere
-            for param in pipe.model.parameters():
-                param.requires_grad = False
-            
-            # Set model to eval mode
+            # Set model to eval mode; gradients are disabled per call by
+            # torch.inference_mode() in generate_response
             pipe.model.eval()
             
-            # Enable attention optimizations if available
-            if hasattr(pipe.model, 'config'):
-                if hasattr(pipe.model.config, 'use_flash_attention_2'):
-                    pipe.model.config.use_flash_attention_2 = True
-                if hasattr(pipe.model.config, 'use_memory_efficient_attention'):
-                    pipe.model.config.use_memory_efficient_attention = True
-            
-            # Compile the model with reduce-overhead mode
-            try:
-                logging.info("[OPTIMIZER] Compiling model with torch.compile(mode='reduce-overhead')...")
-                pipe.model = torch.compile(
-                    pipe.model,
-                    mode="reduce-overhead",
-                    fullgraph=False,
-                    dynamic=False
-                )
-                logging.info("[OPTIMIZER] Model compiled successfully")
-            except Exception as e:
-                logging.warning(f"[OPTIMIZER] Model compilation failed (will use eager mode): {e}")
+            # Compiled lazily on the first generate, under the same
+            # inference_mode context the compiled graph will run in.
+            # bitsandbytes kernels cannot be traced, so quantized models stay eager
+            self._needs_compile = quant_config is None
             
             if pipe.model.device.type == 'cuda':
                 logging.info(f"Model loaded on GPU: {torch.cuda.get_device_name(0)}")
@@ -156,9 +331,110 @@ class Brain:
             logging.error(f"Fatal error loading the language model: {e}")
             raise
 
+    def _quantization_config(self, dtype):
+        """bitsandbytes weight-only quantization for config.LLM_QUANT, or None."""
+        if not LLM_QUANT:
+            return None
+        if not torch.cuda.is_available() or not importlib.util.find_spec("bitsandbytes"):
+            logging.warning(f"[OPTIMIZER] LLM_QUANT={LLM_QUANT!r} needs CUDA and bitsandbytes; loading {dtype} weights")
+            return None
+        if LLM_QUANT == "nf4":
+            # Decode is bandwidth-bound: 4-bit weights cut the bytes read per token ~3-4x
+            logging.info("[OPTIMIZER] Quantizing weights to 4-bit NF4 (double quantization)")
+            return BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_compute_dtype=dtype,
+                bnb_4bit_use_double_quant=True,
+            )
+        if LLM_QUANT == "int8":
+            logging.info("[OPTIMIZER] Quantizing weights to INT8")
+            return BitsAndBytesConfig(load_in_8bit=True)
+        logging.warning(f"[OPTIMIZER] Unknown LLM_QUANT {LLM_QUANT!r}; loading {dtype} weights")
+        return None
+
+    def _load_assistant_model(self):
+        """Load the draft model for speculative decoding, if one is configured."""
+        if not ASSISTANT_MODEL_ID or not self.pipe or self.pipe.model.device.type != 'cuda':
+            return None
+        try:
+            logging.info(f"[OPTIMIZER] Loading assistant model for speculative decoding: {ASSISTANT_MODEL_ID}")
+            assistant = AutoModelForCausalLM.from_pretrained(
+                ASSISTANT_MODEL_ID,
+                torch_dtype=self._dtype,
+                device_map="auto",
+                low_cpu_mem_usage=True,
+            )
+            assistant.eval()
+            return assistant
+        except Exception as e:
+            logging.warning(f"[OPTIMIZER] Assistant model unavailable (decoding without it): {e}")
+            return None
+
+    def _compile_model(self):
+        """Compile the model's forward (call under inference_mode).
+
+        generate() calls forward on the underlying module, so forward itself is
+        compiled; wrapping the module would leave generation in eager mode.
+        On GPU the KV cache is switched to a preallocated static cache, so every
+        decode step has the same shapes and reduce-overhead can replay it as a
+        captured CUDA graph. Elsewhere a growing cache would invalidate graphs,
+        so max-autotune without them is used, as it is with an assistant model:
+        assisted generation needs the regular dynamic cache.
+        """
+        self._needs_compile = False
+        try:
+            model = self.pipe.model
+            use_cuda_graphs = model.device.type == 'cuda' and self.assistant_model is None
+            if use_cuda_graphs:
+                model.generation_config.cache_implementation = "static"
+            mode = "reduce-overhead" if use_cuda_graphs else "max-autotune-no-cudagraphs"
+            logging.info(f"[OPTIMIZER] Compiling model with torch.compile(mode='{mode}')...")
+            model.forward = torch.compile(
+                model.forward,
+                mode=mode,
+                fullgraph=False,
+                dynamic=False
+            )
+            self._compiled = True
+            logging.info("[OPTIMIZER] Model compiled successfully")
+        except Exception as e:
+            logging.warning(f"[OPTIMIZER] Model compilation failed (will use eager mode): {e}")
+
+    def _autocast(self):
+        """Autocast any op still in FP32 after the load-time cast (CUDA only)."""
+        on_cuda = self.pipe.model.device.type == 'cuda'
+        return torch.autocast('cuda', dtype=self._dtype, enabled=on_cuda)
+
+    def _prepare_inputs(self, conversations, min_length=0):
+        """Tokenize chats into one left-padded batch.
+
+        Rows are padded to the longest prompt; for a compiled model that length
+        is rounded up to a bucket. Left padding keeps every row's last prompt
+        token in the final column, where generation continues from.
+        """
+        tokenizer = self.pipe.tokenizer
+        rows = [tokenizer.apply_chat_template(messages, add_generation_prompt=True) for messages in conversations]
+        
+        length = max(len(row) for row in rows)
+        target = max(length, min_length)
+        bucket = next((size for size in PROMPT_BUCKETS if size >= target), target) if self._compiled else length
+        pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+        if pad_id is None:
+            pad_id = 0
+        
+        device = self.pipe.model.device
+        input_ids = torch.tensor([[pad_id] * (bucket - len(row)) + row for row in rows], device=device)
+        attention_mask = torch.tensor([[0] * (bucket - len(row)) + [1] * len(row) for row in rows], device=device)
+        if self._compiled:
+            # The padded length is one of a few buckets: specialise on it
+            torch._dynamo.mark_static(input_ids, 1)
+            torch._dynamo.mark_static(attention_mask, 1)
+        return input_ids, attention_mask
+
     def generate_response(self, messages, initial=False):
         """Generates a response from the LLM based on the conversation history."""
-        if not self.pipe:
+        if not self.wait_until_ready():
             logging.error("Model pipeline is not available.")
             return "My brain isn't working right now."
 
@@ -185,23 +461,12 @@ class Brain:
                             messages = messages_with_memory
                             logging.info(f"[brain] Injected {len(memories.splitlines())} lines of memory context")
             
-            # Use different generation arguments for the initial greeting
-            gen_args = INITIAL_GEN_ARGS if initial else GENERATION_ARGS
-            
-            # Add the pad_token_id to the arguments if tokenizer is available
-            try:
-                tokenizer = getattr(self.pipe, 'tokenizer', None)
-                if tokenizer is not None and getattr(tokenizer, 'eos_token_id', None) is not None:
-                    gen_args['pad_token_id'] = tokenizer.eos_token_id
-                else:
-                    # fallback: use pad_token_id=0 safely if tokenizer doesn't expose eos_token_id
-                    gen_args.setdefault('pad_token_id', 0)
-            except Exception:
-                gen_args.setdefault('pad_token_id', 0)
-            
             try:
-                outputs = self.pipe(messages, **gen_args)
-                return outputs[-1]['generated_text']
+                # Generation runs on the worker thread, batched with any other
+                # requests waiting at the same time
+                future = Future()
+                self._requests.put((messages, initial, future))
+                return future.result()
             except RuntimeError as e:
                 # Handle CUDA kernel errors during generation
                 if "no kernel image is available" in str(e) or "CUDA error" in str(e):
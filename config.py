@@ -4,6 +4,12 @@
 # --- Model Configurations ---
 # LLM model for the brain
 LLM_MODEL_ID = "chuanli11/Llama-3.2-3B-Instruct-uncensored"  # Or your preferred model
+# Optional small draft model for speculative (assisted) decoding; it must share
+# the main model's tokenizer, e.g. "meta-llama/Llama-3.2-1B-Instruct". None = off
+ASSISTANT_MODEL_ID = None
+# Weight-only quantization of the LLM via bitsandbytes: "nf4" (4-bit), "int8",
+# or None for plain BF16/FP16 weights. Ignored when bitsandbytes or CUDA is missing
+LLM_QUANT = "nf4"
 
 # STT (Whisper) model settings
 STT_MODEL_SIZE = "large-v3"  # Options: "tiny", "base", "small", "medium", "large-v3"
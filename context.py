@@ -2,7 +2,8 @@
 # core/context.py
 """Conversation context manager.
 
-Creates a brand‑new JSON file for each chat session and never merges
+Creates a brand‑new JSON Lines file for each chat session (one message
+per line, appended as the conversation grows) and never merges
 previous sessions unless explicitly queried. Provides lightweight helpers
 to list or search past logs on demand (query style) without polluting the
 active conversation history.
@@ -10,9 +11,43 @@ active conversation history.
 from __future__ import annotations
 import json
 import logging
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional
+
+try:
+    import orjson  # Optional: faster log writing and parsing
+    _json_loads = orjson.loads
+
+    def _json_line(msg) -> bytes:
+        return orjson.dumps(msg, option=orjson.OPT_APPEND_NEWLINE)
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_line(msg) -> bytes:
+        return (json.dumps(msg, ensure_ascii=False) + "\n").encode("utf-8")
+
+# Words indexed for memory search: the same "longer than 3 characters" rule
+# search_and_format_memories applies to the user's query
+_WORD_RE = re.compile(r"\w{4,}")
+
+
+def _index_terms(content: str) -> set:
+    return set(_WORD_RE.findall(content.lower()))
+
+
+# Phrases that mark a question about past conversations, scanned in one pass.
+# Only the start is anchored so "remembered" or "recalling" still match.
+_MEMORY_QUERY_RE = re.compile(
+    r"\b(?:remember|recall|what did|earlier|before|previous|last time|you said"
+    r"|we talked about|mentioned|discussed|conversation about)",
+    re.IGNORECASE,
+)
 
 
 class ContextManager:
@@ -20,12 +55,23 @@ class ContextManager:
         self.log_dir = Path(log_dir)
         self.log_dir.mkdir(exist_ok=True)
         self.session_started = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        self.session_file = self.log_dir / f"chat_{self.session_started}.json"
+        self.session_file = self.log_dir / f"chat_{self.session_started}.jsonl"
         self.auto_save = auto_save
         self.messages: List[Dict[str, str]] = [
             {"role": "system", "content": system_prompt}
         ]
+        # Sorted chat log names, reused until the directory's mtime changes
+        self._log_cache: Optional[List[str]] = None
+        self._log_cache_mtime: int = 0
+        self._index_lock = threading.Lock()
+        # Set once logs from before the index are in it; searches scan until then
+        self._index_ready = threading.Event()
+        self._index = self._open_index()
+        if self._index is not None:
+            threading.Thread(target=self._index_past_logs, name="context-index", daemon=True).start()
         self._write_session()
+        if self.auto_save:
+            self._index_messages(self.session_file.name, [(0, system_prompt)])
         logging.info(f"[context] New session file created: {self.session_file}")
 
     # ---------------- Core API ----------------
@@ -38,7 +84,8 @@ class ContextManager:
         })
         logging.info(f"[context] add_message role={role}; total={len(self.messages)}")
         if self.auto_save:
-            self._write_session()
+            self._append_message(self.messages[-1])
+            self._index_messages(self.session_file.name, [(len(self.messages) - 1, content)])
 
     def get_history(self) -> List[Dict[str, str]]:
         logging.debug(f"[context] get_history len={len(self.messages)}")
@@ -49,26 +96,140 @@ class ContextManager:
         logging.info("[context] History cleared (system prompt retained)")
         if self.auto_save:
             self._write_session()
+            self._drop_from_index(self.session_file.name)
+            self._index_messages(self.session_file.name, [(0, system_prompt)])
 
     # ---------------- Persistence ----------------
     def _write_session(self) -> None:
+        """Rewrite the whole session file (new session, cleared history, snapshot)."""
+        try:
+            with open(self.session_file, "wb") as f:
+                f.write(b"".join(_json_line(msg) for msg in self.messages))
+        except Exception as e:
+            logging.error(f"[context] Failed writing session file: {e}")
+
+    def _append_message(self, msg: Dict[str, str]) -> None:
+        """Persist one new message; cost stays O(message) however long the chat gets."""
         try:
-            with open(self.session_file, "w", encoding="utf-8") as f:
-                json.dump(self.messages, f, indent=2, ensure_ascii=False)
+            with open(self.session_file, "ab") as f:
+                f.write(_json_line(msg))
         except Exception as e:
             logging.error(f"[context] Failed writing session file: {e}")
 
     def save_snapshot(self) -> Path:
-        """Explicit snapshot (alias kept for controller compatibility)."""
+        """Explicit full write of the session (alias kept for controller compatibility)."""
         self._write_session()
         logging.info(f"[context] Snapshot saved: {self.session_file}")
         return self.session_file
 
+    # ---------------- Search index ----------------
+    def _open_index(self) -> Optional[sqlite3.Connection]:
+        """Open the word -> (file, message index) sidecar."""
+        try:
+            conn = sqlite3.connect(self.log_dir / "_index.sqlite", check_same_thread=False)
+            conn.execute("CREATE TABLE IF NOT EXISTS terms (term TEXT, file TEXT, idx INTEGER)")
+            conn.execute("CREATE INDEX IF NOT EXISTS terms_term ON terms (term)")
+            conn.execute("CREATE TABLE IF NOT EXISTS indexed_files (file TEXT PRIMARY KEY)")
+            conn.commit()
+        except sqlite3.Error as e:
+            logging.warning(f"[context] Search index unavailable, falling back to scans: {e}")
+            return None
+        return conn
+
+    def _index_past_logs(self) -> None:
+        """Index logs written before the index existed (or by an older version).
+        
+        Runs on a background thread so a large history does not hold up startup.
+        """
+        try:
+            with self._index_lock:
+                indexed = {row[0] for row in self._index.execute("SELECT file FROM indexed_files")}
+            for log_file in self.list_past_logs():
+                if log_file.name in indexed:
+                    continue
+                data = self.load_log(log_file) or []
+                self._index_messages(log_file.name, (
+                    (i, msg.get("content", "")) for i, msg in enumerate(data) if isinstance(msg, dict)
+                ))
+        except Exception as e:
+            logging.error("[context] Indexing past logs failed, searches will scan: %s", e)
+            return
+        self._index_ready.set()
+
+    def _index_messages(self, file: str, messages: Iterable) -> None:
+        """Add (message index, content) pairs of a log file to the index in one transaction."""
+        conn = self._index
+        if conn is None:
+            return
+        rows = [(term, file, idx) for idx, content in messages for term in _index_terms(content or "")]
+        try:
+            with self._index_lock, conn:
+                conn.executemany("INSERT INTO terms VALUES (?, ?, ?)", rows)
+                conn.execute("INSERT OR IGNORE INTO indexed_files VALUES (?)", (file,))
+        except sqlite3.Error as e:
+            logging.error(f"[context] Failed updating search index: {e}")
+
+    def _drop_from_index(self, file: str) -> None:
+        if self._index is None:
+            return
+        try:
+            with self._index_lock, self._index:
+                self._index.execute("DELETE FROM terms WHERE file = ?", (file,))
+        except sqlite3.Error as e:
+            logging.error(f"[context] Failed updating search index: {e}")
+
+    def _indexed_search(self, terms: List[str], limit: int) -> Optional[List[Dict[str, str]]]:
+        """Look up indexed words starting with any of the terms; None when the index cannot answer.
+        
+        Prefix ranges keep "pizza" matching "pizzas"; a term in the middle of a
+        word ("bar" in "foo_bar") is not found. Until past logs are indexed the
+        index is incomplete, so it does not answer.
+        """
+        if self._index is None or not terms or not self._index_ready.is_set():
+            return None
+        # A range per term is still an index seek on terms(term)
+        ranges = " OR ".join(["(term >= ? AND term < ?)"] * len(terms))
+        bounds = [bound for term in terms for bound in (term, term + "\U0010ffff")]
+        try:
+            with self._index_lock:
+                # File names sort by session time: newest sessions first
+                hits = self._index.execute(
+                    f"SELECT DISTINCT file, idx FROM terms WHERE ({ranges}) AND file != ? "
+                    "ORDER BY file DESC, idx LIMIT ?",
+                    (*bounds, self.session_file.name, limit),
+                ).fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"[context] Search index query failed: {e}")
+            return None
+        
+        results: List[Dict[str, str]] = []
+        logs: Dict[str, list] = {}
+        for file, idx in hits:
+            if file not in logs:
+                logs[file] = self.load_log(self.log_dir / file) or []
+            data = logs[file]
+            if idx < len(data) and isinstance(data[idx], dict):
+                results.append({"file": file, **data[idx]})
+        return results
+
     # ---------------- Query Utilities (do NOT modify current history) ----------------
     def list_past_logs(self) -> List[Path]:
-        files = sorted(self.log_dir.glob("chat_*.json"))
+        # Creating, deleting or renaming a log bumps the directory mtime;
+        # appending to one does not, and does not change the listing either
+        mtime = os.stat(self.log_dir).st_mtime_ns
+        if self._log_cache is None or mtime != self._log_cache_mtime:
+            # Names embed the session timestamp, so sorting the plain strings from
+            # scandir orders sessions oldest first without building Path objects
+            with os.scandir(self.log_dir) as entries:
+                self._log_cache = sorted(
+                    e.name for e in entries
+                    if e.name.startswith("chat_") and e.name.endswith((".json", ".jsonl")) and e.is_file()
+                )
+            self._log_cache_mtime = mtime
+        names = self._log_cache
         # Exclude the current session file path from listing of 'past'
-        return [p for p in files if p != self.session_file]
+        current = self.session_file.name
+        return [self.log_dir / name for name in names if name != current]
 
     def load_log(self, file_path: str | Path) -> Optional[List[Dict[str, str]]]:
         p = Path(file_path)
@@ -76,29 +237,62 @@ class ContextManager:
             logging.warning(f"[context] load_log: file not found {p}")
             return None
         try:
-            with open(p, "r", encoding="utf-8") as f:
-                return json.load(f)
+            # Both decoders take UTF-8 bytes directly
+            with open(p, "rb") as f:
+                if p.suffix == ".jsonl":
+                    return [_json_loads(line) for line in f if line.strip()]
+                # Sessions saved before the switch to JSON Lines
+                return _json_loads(f.read())
         except Exception as e:
             logging.error(f"[context] Failed to load log {p}: {e}")
             return None
 
     def search_past(self, term: str, limit: int = 5) -> List[Dict[str, str]]:
-        """Search past logs for messages containing the term (case-insensitive)."""
-        term_l = term.lower()
+        """Search past logs for messages containing the term (case-insensitive).
+        
+        A single word is answered from the index (matching words it starts);
+        anything else is matched as a substring by scanning the logs.
+        """
+        word = term.lower()
+        if _WORD_RE.fullmatch(word):
+            results = self._indexed_search([word], limit)
+            if results is not None:
+                return results
+        
+        # Compiled once; matching in C avoids a lowercased copy of every message
+        pattern = re.compile(re.escape(term), re.IGNORECASE)
         results: List[Dict[str, str]] = []
-        for log_file in reversed(self.list_past_logs()):  # newest first
-            try:
-                with open(log_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                for msg in data:
-                    if term_l in msg.get("content", "").lower():
-                        results.append({"file": log_file.name, **msg})
-                        if len(results) >= limit:
-                            return results
-            except Exception:
-                continue
+        log_files = list(reversed(self.list_past_logs()))  # newest first
+        if not log_files:
+            return results
+        
+        # Files are read and parsed on a few threads, but hits are still taken
+        # newest file first; files not started yet are cancelled once enough are in
+        pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1, len(log_files)))
+        try:
+            futures = [pool.submit(self._scan_log, log_file, pattern, limit) for log_file in log_files]
+            for future in futures:
+                for hit in future.result():
+                    results.append(hit)
+                    if len(results) >= limit:
+                        return results
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
         return results
 
+    def _scan_log(self, log_file: Path, pattern: re.Pattern, limit: int) -> List[Dict[str, str]]:
+        """Up to ``limit`` messages of one log file that match ``pattern``."""
+        hits: List[Dict[str, str]] = []
+        try:
+            for msg in self.load_log(log_file) or []:
+                if pattern.search(msg.get("content", "")):
+                    hits.append({"file": log_file.name, **msg})
+                    if len(hits) >= limit:
+                        break
+        except Exception:
+            pass
+        return hits
+
     def format_search_results_for_context(self, results: List[Dict[str, str]]) -> str:
         """Format search results into a readable string for LLM context."""
         if not results:
@@ -117,13 +311,7 @@ class ContextManager:
 
     def detect_memory_query(self, user_input: str) -> bool:
         """Detect if user is asking about past conversations."""
-        memory_keywords = [
-            "remember", "recall", "what did", "earlier", "before",
-            "previous", "last time", "you said", "we talked about",
-            "mentioned", "discussed", "conversation about"
-        ]
-        user_lower = user_input.lower()
-        return any(keyword in user_lower for keyword in memory_keywords)
+        return _MEMORY_QUERY_RE.search(user_input) is not None
 
     def search_and_format_memories(self, query: str, limit: int = 5) -> Optional[str]:
         """Search past conversations and format results for LLM context.
@@ -135,16 +323,24 @@ class ContextManager:
         Returns:
             Formatted string of past conversations, or None if no results
         """
-        # Extract key terms from the query (simple approach: use words longer than 3 chars)
-        words = query.split()
-        search_terms = [w.strip(".,!?") for w in words if len(w.strip(".,!?")) > 3]
+        # Extract key terms from the query (words longer than 3 chars) in one
+        # C-level pass; dict.fromkeys drops repeats but keeps query order
+        search_terms = list(dict.fromkeys(_WORD_RE.findall(query.lower())))
+        
+        # One index lookup for every term instead of a scan per term
+        indexed = self._indexed_search(search_terms, limit)
+        if indexed is not None:
+            return self.format_search_results_for_context(indexed) if indexed else None
         
         all_results = []
+        seen = set()
         for term in search_terms:
             results = self.search_past(term, limit=limit)
             for r in results:
-                # Avoid duplicates
-                if r not in all_results:
+                # Avoid duplicates; a set lookup instead of comparing dicts
+                key = (r.get("file"), r.get("timestamp"), r.get("role"), r.get("content"))
+                if key not in seen:
+                    seen.add(key)
                     all_results.append(r)
             if len(all_results) >= limit:
                 break
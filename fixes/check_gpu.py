@@ -1,23 +1,77 @@
 """
 GPU Detection and Ollama Configuration Check
 """
+import functools
 import subprocess
 import json
 import sys
 
+try:
+    import pynvml  # Optional (pip install nvidia-ml-py): query the driver in-process
+except ImportError:
+    pynvml = None
+
+try:
+    import wmi  # Optional (pip install wmi, Windows only): WMI without starting PowerShell
+except ImportError:
+    wmi = None
+
+_nvml_handle = None  # Handle of GPU 0, initialised once per run
+
+def _gpu_handle():
+    """NVML handle of GPU 0, or None to fall back to nvidia-smi"""
+    global _nvml_handle
+    if _nvml_handle is None and pynvml is not None:
+        try:
+            pynvml.nvmlInit()
+            _nvml_handle = pynvml.nvmlDeviceGetHandleByIndex(0)
+        except pynvml.NVMLError:
+            return None
+    return _nvml_handle
+
+def _text(value):
+    # Older pynvml releases return bytes
+    return value.decode() if isinstance(value, bytes) else value
+
+@functools.lru_cache(maxsize=1)
+def _video_controllers():
+    """Name and AdapterRAM of each video controller, one adapter per line (queried once)"""
+    if wmi is not None:
+        try:
+            adapters = wmi.WMI().Win32_VideoController()
+            return "\n".join(f"{a.Name}  {a.AdapterRAM}" for a in adapters) + "\n"
+        except Exception:
+            pass  # Fall back to PowerShell below
+    result = subprocess.run(
+        ['powershell', '-Command', 'Get-WmiObject Win32_VideoController | Select-Object Name, AdapterRAM'],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return result.stdout
+
 def check_nvidia_gpu():
     """Check NVIDIA GPU status"""
     print("=" * 60)
     print("🔍 NVIDIA GPU CHECK")
     print("=" * 60)
     try:
-        result = subprocess.run(
-            ['nvidia-smi', '--query-gpu=name,driver_version,memory.total,memory.used,memory.free', '--format=csv,noheader'],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        gpu_info = result.stdout.strip()
+        handle = _gpu_handle()
+        if handle is not None:
+            mem = pynvml.nvmlDeviceGetMemoryInfo(handle)
+            mib = 1024 * 1024
+            gpu_info = (
+                f"{_text(pynvml.nvmlDeviceGetName(handle))}, {_text(pynvml.nvmlSystemGetDriverVersion())}, "
+                f"{mem.total // mib} MiB, {mem.used // mib} MiB, {mem.free // mib} MiB"
+            )
+        else:
+            result = subprocess.run(
+                ['nvidia-smi', '--query-gpu=name,driver_version,memory.total,memory.used,memory.free', '--format=csv,noheader'],
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            gpu_info = result.stdout.strip()
         print(f"✅ GPU Detected: {gpu_info}\n")
         return True
     except Exception as e:
@@ -64,13 +118,17 @@ def test_model_gpu_usage(model_name="qwen3:4b"):
         
         # Check GPU memory usage while model is loaded
         print("Checking GPU memory usage...")
-        gpu_result = subprocess.run(
-            ['nvidia-smi', '--query-gpu=memory.used', '--format=csv,noheader,nounits'],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        memory_used = int(gpu_result.stdout.strip())
+        handle = _gpu_handle()
+        if handle is not None:
+            memory_used = pynvml.nvmlDeviceGetMemoryInfo(handle).used // (1024 * 1024)
+        else:
+            gpu_result = subprocess.run(
+                ['nvidia-smi', '--query-gpu=memory.used', '--format=csv,noheader,nounits'],
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            memory_used = int(gpu_result.stdout.strip())
         print(f"GPU Memory Used: {memory_used} MB")
         
         if memory_used > 2000:  # More than 2GB indicates GPU usage
@@ -119,16 +177,11 @@ def check_integrated_graphics():
     
     try:
         # Check Windows GPU preference
-        result = subprocess.run(
-            ['powershell', '-Command', 'Get-WmiObject Win32_VideoController | Select-Object Name, AdapterRAM'],
-            capture_output=True,
-            text=True,
-            check=True
-        )
+        adapters = _video_controllers()
         print("Graphics Adapters:")
-        print(result.stdout)
+        print(adapters)
         
-        if 'Intel' in result.stdout or 'AMD' in result.stdout:
+        if 'Intel' in adapters or 'AMD' in adapters:
             print("⚠️ WARNING: Integrated graphics detected!")
             print("   Ollama might be defaulting to integrated GPU.\n")
             print("SOLUTION:")
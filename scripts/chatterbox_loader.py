@@ -11,14 +11,45 @@ import sys
 import json
 import tempfile
 import subprocess
+from math import gcd
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
+
+# Heavy imports are paid once when the loader is imported, not on the first
+# voice extraction (which is already the slowest user-facing call)
+import numpy as np
+import torch
+
+try:
+    import soundfile as sf
+    import scipy.signal
+except ImportError:  # Only needed for voice cloning
+    sf = None
+
+try:
+    from torchaudio.functional import resample as torch_resample
+except ImportError:
+    torch_resample = None
+
+# tts_optimizer lives in the project root, one level above scripts/
+_BASE_DIR = Path(__file__).parent.parent
+if str(_BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(_BASE_DIR))
+from tts_optimizer import OptimizationConfig, VoiceEmbeddingCache, inference_ctx
 
 # Try to detect Chatterbox venv
 CHATTERBOX_PYTHON = os.getenv('CHATTERBOX_PYTHON')
 if CHATTERBOX_PYTHON:
     CHATTERBOX_PYTHON = str(Path(CHATTERBOX_PYTHON).absolute())
 
+# Reference clips longer than this are encoded as overlapping windows whose
+# embeddings are averaged (speaker identity is stable after a few seconds)
+VOICE_CHUNK_MIN_SECONDS = 5.0
+VOICE_WINDOW_SECONDS = 3.0  # Window length; windows overlap by half
+
+# Interpreter found by find_chatterbox_python, reused by later calls
+_FOUND_PYTHON: Optional[str] = None
+
 # Fallback: common locations
 COMMON_VENV_PATHS = [
     Path(__file__).parent.parent / 'venv_chatterbox' / 'Scripts' / 'python.exe',
@@ -29,35 +60,40 @@ COMMON_VENV_PATHS = [
 
 def find_chatterbox_python() -> Optional[str]:
     """Find Python interpreter with Chatterbox installed."""
+    global _FOUND_PYTHON
+    if _FOUND_PYTHON is not None:
+        return _FOUND_PYTHON
+    _FOUND_PYTHON = _probe_chatterbox_python()
+    return _FOUND_PYTHON
+
+
+def _has_chatterbox(python_path: Path) -> bool:
+    """Check the venv's site-packages for chatterbox without starting Python.
+    
+    Spawning the interpreter to ``import chatterbox`` takes seconds per
+    candidate (librosa/numba imports); a stat takes microseconds.
+    """
+    return (python_path.parent.parent / 'Lib' / 'site-packages' / 'chatterbox').is_dir()
+
+
+def _probe_chatterbox_python() -> Optional[str]:
     # Explicit setting
     if CHATTERBOX_PYTHON and Path(CHATTERBOX_PYTHON).exists():
         return CHATTERBOX_PYTHON
     
     # Check common locations
     for path in COMMON_VENV_PATHS:
-        if path.exists():
-            # Verify Chatterbox is installed
-            result = subprocess.run(
-                [str(path), '-c', 'import chatterbox'],
-                capture_output=True,
-                timeout=10
-            )
-            if result.returncode == 0:
-                return str(path)
+        # Verify Chatterbox is installed
+        if path.exists() and _has_chatterbox(path):
+            return str(path)
     
     # If not found in common locations, try to find any venv with chatterbox
     print("[DEBUG] Searching for venv_chatterbox in current directory and parent directories...")
     current = Path.cwd()
     for _ in range(3):  # Search up to 3 levels up
         venv_path = current / 'venv_chatterbox' / 'Scripts' / 'python.exe'
-        if venv_path.exists():
-            result = subprocess.run(
-                [str(venv_path), '-c', 'import chatterbox'],
-                capture_output=True,
-                timeout=10
-            )
-            if result.returncode == 0:
-                return str(venv_path)
+        if venv_path.exists() and _has_chatterbox(venv_path):
+            return str(venv_path)
         current = current.parent
     
     return None
@@ -71,7 +107,9 @@ class ChatterboxLoader:
         self.sample_rate = 22050
         self.device = 'cuda'
         self.is_loaded = False
-        self._voice_cache = {}  # Cache for voice embeddings
+        # Voice embeddings on disk and in memory, keyed by file content hash
+        self._voice_cache = VoiceEmbeddingCache()
+        self._opt_config = OptimizationConfig()
     
     def load_from_venv(self, python_path: Optional[str] = None) -> bool:
         """Load Chatterbox using dedicated venv."""
@@ -89,7 +127,6 @@ class ChatterboxLoader:
         try:
             # This only works if current venv has chatterbox
             from chatterbox import ChatterboxTTS
-            import torch
             
             print("[CHATTERBOX] Loading model...")
             device = torch.device('cuda')
@@ -113,15 +150,15 @@ class ChatterboxLoader:
         if not self.is_loaded or self.model is None:
             raise RuntimeError("Chatterbox model not loaded")
         
-        # Check cache first
-        if audio_path in self._voice_cache:
+        # Check cache first (survives restarts; an edited file misses)
+        cached = self._voice_cache.get(audio_path, 'chatterbox')
+        if cached is not None:
             print(f"[VOICE] Using cached embedding from {audio_path}")
-            return self._voice_cache[audio_path]
+            return cached.to(self.device, non_blocking=True)
         
-        import torch
-        import soundfile as sf
-        import scipy.signal
-        from pathlib import Path
+        if sf is None:
+            print("[VOICE] soundfile/scipy not installed; voice cloning unavailable")
+            return None
         
         try:
             audio_path = str(Path(audio_path).absolute())
@@ -132,27 +169,58 @@ class ChatterboxLoader:
             
             print(f"[VOICE] Extracting embedding from: {audio_path}")
             
-            # Load audio using soundfile instead of torchaudio (avoids torchcodec)
-            audio_data, sr = sf.read(audio_path)
+            # Load audio using soundfile instead of torchaudio (avoids torchcodec);
+            # soundfile converts to float32 itself, so no float64 intermediate
+            audio_data, sr = sf.read(audio_path, dtype='float32', always_2d=False)
             
             # Ensure mono
-            if len(audio_data.shape) > 1:
-                audio_data = audio_data.mean(axis=1)
+            if audio_data.ndim > 1:
+                audio_data = audio_data.mean(axis=1, dtype=np.float32)
             
-            # Resample if needed
-            if sr != self.sample_rate:
-                num_samples = int(len(audio_data) * self.sample_rate / sr)
-                audio_data = scipy.signal.resample(audio_data, num_samples)
+            # Resample if needed. With torchaudio this runs on the model's
+            # device: the waveform goes there anyway, and the windowed-sinc
+            # filter is a single strided conv1d
+            if sr != self.sample_rate and torch_resample is None:
+                # Polyphase filtering is a short FIR pass; FFT resample gets
+                # very slow for clip lengths with large prime factors
+                g = gcd(sr, self.sample_rate)
+                try:
+                    audio_data = scipy.signal.resample_poly(audio_data, self.sample_rate // g, sr // g)
+                except Exception:
+                    num_samples = int(len(audio_data) * self.sample_rate / sr)
+                    audio_data = scipy.signal.resample(audio_data, num_samples)
             
-            # Convert to tensor
-            waveform = torch.from_numpy(audio_data).float().to(self.device)
+            # Convert to tensor. One upload per clip: pinning a fresh staging
+            # buffer would cost more than the pageable copy it speeds up
+            waveform = torch.from_numpy(np.ascontiguousarray(audio_data, dtype=np.float32)).to(self.device)
             if waveform.dim() == 1:
                 waveform = waveform.unsqueeze(0)  # Add channel dimension
             
             # Extract voice embedding using the model
             with torch.inference_mode():
+                if sr != self.sample_rate and torch_resample is not None:
+                    waveform = torch_resample(waveform, sr, self.sample_rate, resampling_method='sinc_interp_kaiser')
+                
                 # Try to extract voice embedding
-                if hasattr(self.model, 'extract_voice_embedding'):
+                ve = getattr(self.model, 've', None)
+                if hasattr(ve, 'forward_frames') and hasattr(ve, 'forward_embedding'):
+                    # Long clips go through the encoder as one batch of
+                    # overlapping windows, so activation memory stays constant
+                    windows = waveform
+                    if waveform.shape[-1] > VOICE_CHUNK_MIN_SECONDS * self.sample_rate:
+                        window = int(VOICE_WINDOW_SECONDS * self.sample_rate)
+                        windows = waveform.unfold(-1, window, window // 2).reshape(-1, window)
+                    # Heavy frame encoder under FP16; pooling stays FP32 to
+                    # keep the embedding statistics accurate
+                    with torch.amp.autocast('cuda', dtype=torch.float16, enabled=waveform.is_cuda):
+                        frames = ve.forward_frames(windows)
+                    voice_embedding = ve.forward_embedding(frames.float())
+                    if windows is not waveform:
+                        # The mean of unit speaker embeddings is shorter than one
+                        voice_embedding = torch.nn.functional.normalize(
+                            voice_embedding.mean(dim=0, keepdim=True), dim=-1
+                        )
+                elif hasattr(self.model, 'extract_voice_embedding'):
                     voice_embedding = self.model.extract_voice_embedding(waveform)
                 elif hasattr(self.model, 'encode_voice'):
                     voice_embedding = self.model.encode_voice(waveform)
@@ -162,8 +230,9 @@ class ChatterboxLoader:
                     voice_embedding = waveform
             
             # Cache the embedding
-            self._voice_cache[audio_path] = voice_embedding
-            print(f"[VOICE] Embedding cached for faster subsequent use")
+            if isinstance(voice_embedding, torch.Tensor):
+                self._voice_cache.put(audio_path, voice_embedding, 'chatterbox')
+                print(f"[VOICE] Embedding cached for faster subsequent use")
             
             return voice_embedding
             
@@ -176,9 +245,6 @@ class ChatterboxLoader:
         if not self.is_loaded or self.model is None:
             raise RuntimeError("Chatterbox model not loaded")
         
-        import torch
-        import numpy as np
-        
         # Handle voice cloning
         if voice_cloning_audio:
             voice_embedding = self.extract_voice(voice_cloning_audio)
@@ -188,25 +254,52 @@ class ChatterboxLoader:
                 kwargs['audio_prompt_path'] = voice_cloning_audio
                 print(f"[VOICE] Using voice clone from: {voice_cloning_audio}")
         
-        with torch.inference_mode():
+        with inference_ctx(self._opt_config):
             audio = self.model.generate(text, **kwargs)
         
+        return self._to_float32(audio), self.sample_rate
+    
+    def generate_batch(self, texts: List[str], voice_cloning_audio: Optional[str] = None, **kwargs) -> List[Tuple]:
+        """Generate audio for several texts, preparing the voice conditioning once.
+        
+        Chatterbox decodes one utterance per generate call, so texts still run
+        in sequence; what is shared is the reference-audio work that generate()
+        would otherwise redo for every text.
+        """
+        if not self.is_loaded or self.model is None:
+            raise RuntimeError("Chatterbox model not loaded")
+        
+        results = []
+        with inference_ctx(self._opt_config):
+            if voice_cloning_audio and hasattr(self.model, 'prepare_conditionals'):
+                # Errors propagate: the caller asked for this voice
+                prepare_kwargs = {'exaggeration': kwargs['exaggeration']} if 'exaggeration' in kwargs else {}
+                self.model.prepare_conditionals(voice_cloning_audio, **prepare_kwargs)
+                print(f"[VOICE] Using voice clone from: {voice_cloning_audio}")
+            elif voice_cloning_audio:
+                kwargs['audio_prompt_path'] = voice_cloning_audio
+            
+            for text in texts:
+                audio = self.model.generate(text, **kwargs)
+                results.append((self._to_float32(audio), self.sample_rate))
+        return results
+    
+    def _to_float32(self, audio) -> np.ndarray:
+        """Model output as a mono float32 array (half a second of silence if empty)."""
         # Convert to numpy
         if isinstance(audio, torch.Tensor):
             audio = audio.detach().cpu().numpy()
         
         arr = np.asarray(audio).squeeze()
-        if arr.dtype == np.int16:
-            arr = arr.astype(np.float32) / 32768.0
-        elif arr.dtype == np.int32:
-            arr = arr.astype(np.float32) / 2147483648.0
-        else:
-            arr = arr.astype(np.float32)
+        if arr.dtype != np.float32:
+            # Convert and scale in one pass instead of a float copy plus a division
+            scale = {np.int16: 1 / 32768.0, np.int32: 1 / 2147483648.0}.get(arr.dtype.type, 1.0)
+            arr = np.multiply(arr, np.float32(scale), dtype=np.float32)
         
         if arr.size == 0:
             arr = np.zeros(self.sample_rate // 2, dtype=np.float32)
         
-        return arr, self.sample_rate
+        return arr
     
     def clear_voice_cache(self):
         """Clear cached voice embeddings."""
@@ -459,7 +459,7 @@ async function sendMessage() {
     showLoading(includeScreen ? 'Analyzing screen and generating response...' : 'Generating response...');
     
     try {
-        const response = await fetch('/api/agent/chat', {
+        const response = await fetch('/api/agent/chat/stream', {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
             body: JSON.stringify({
@@ -468,12 +468,52 @@ async function sendMessage() {
             })
         });
         
-        const data = await response.json();
+        // Not a stream (e.g. agent not initialized) - plain JSON error
+        if (!(response.headers.get('Content-Type') || '').includes('text/event-stream')) {
+            const data = await response.json();
+            addChatMessage('error', data.message || data.error || 'Failed to get response');
+            return;
+        }
         
-        if (data.success) {
-            addChatMessage('agent', data.response, data.screenshot);
-        } else {
-            addChatMessage('error', data.error || 'Failed to get response');
+        // Render tokens as they arrive
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        let messageDiv = null;
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            
+            for (const event of events) {
+                if (!event.startsWith('data: ')) continue;
+                const data = JSON.parse(event.slice(6));
+                
+                if (data.token) {
+                    if (!messageDiv) {
+                        hideLoading();
+                        messageDiv = addChatMessage('agent', '');
+                    }
+                    text += data.token;
+                    messageDiv.querySelector('.message-content').textContent = text;
+                    messageDiv.parentElement.scrollTop = messageDiv.parentElement.scrollHeight;
+                } else if (data.error) {
+                    addChatMessage('error', data.error);
+                } else if (data.done) {
+                    if (!messageDiv) {
+                        messageDiv = addChatMessage('agent', text);
+                    }
+                    if (data.screenshot) {
+                        messageDiv.insertAdjacentHTML('beforeend',
+                            `<img src="/api/agent/screenshots/${data.screenshot}" class="message-screenshot" alt="Screenshot">`);
+                    }
+                }
+            }
         }
     } catch (error) {
         addChatMessage('error', 'Chat failed: ' + error.message);
@@ -556,6 +596,7 @@ function addChatMessage(role, content, screenshot = null) {
     messageDiv.innerHTML = html;
     container.appendChild(messageDiv);
     container.scrollTop = container.scrollHeight;
+    return messageDiv;
 }
 
 function updateButtonStates() {
@@ -19,7 +19,6 @@ This module ensures numerical stability while maximizing GPU utilization.
 import os
 import sys
 import hashlib
-import pickle
 import time
 import psutil
 import warnings
@@ -31,8 +30,15 @@ from dataclasses import dataclass
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torch.cuda.amp import autocast
+from torch.amp import autocast
 import numpy as np
+from safetensors import safe_open
+from safetensors.torch import save_file
+
+try:
+    from blake3 import blake3  # Optional: SIMD file hashing for the embedding cache
+except ImportError:
+    blake3 = None
 
 # Suppress warnings for cleaner output
 warnings.filterwarnings('ignore', category=UserWarning)
@@ -107,6 +113,15 @@ def supports_bf16() -> bool:
     return torch.cuda.is_bf16_supported()
 
 
+@contextmanager
+def inference_ctx(config: OptimizationConfig):
+    """inference_mode plus CUDA autocast as configured, for TTS forward passes."""
+    dtype = torch.bfloat16 if config.enable_bf16 and supports_bf16() else torch.float16
+    enabled = (config.enable_fp16 or config.enable_bf16) and torch.cuda.is_available()
+    with torch.inference_mode(config.use_inference_mode), autocast('cuda', dtype=dtype, enabled=enabled):
+        yield
+
+
 def setup_optimal_threads(num_threads: Optional[int] = None):
     """Set optimal thread count for CPU operations."""
     if num_threads is None:
@@ -151,13 +166,21 @@ def enable_flash_attention():
 # =============================================================================
 
 class PreallocatedBufferPool:
-    """Pool of preallocated tensors to avoid runtime allocation overhead."""
+    """Pool of preallocated tensors to avoid runtime allocation overhead.
+    
+    Device buffers come from get(); pinned host staging buffers come from
+    get_host() and are uploaded with async_to_device(), so the next host
+    buffer can be filled while the GPU consumes the previous one.
+    """
     
     def __init__(self, device: torch.device, dtype: torch.dtype = torch.float16):
         self.device = device
         self.dtype = dtype
         self.buffers: Dict[Tuple[tuple, torch.dtype], List[torch.Tensor]] = {}
+        self.host_buffers: Dict[Tuple[tuple, torch.dtype], List[torch.Tensor]] = {}
         self.max_pool_size = 10
+        on_cuda = torch.device(device).type == 'cuda' and torch.cuda.is_available()
+        self._copy_stream = torch.cuda.Stream(device=device) if on_cuda else None
     
     def get(self, shape: Tuple[int, ...], dtype: Optional[torch.dtype] = None) -> torch.Tensor:
         """Get a preallocated buffer or create a new one."""
@@ -171,23 +194,60 @@ class PreallocatedBufferPool:
             buffer.zero_()  # Clear for reuse
             return buffer
         
-        # Create new buffer with pinned memory for faster transfers
+        # Create new buffer on the pool's device
         buffer = torch.zeros(shape, dtype=dtype, device=self.device)
         return buffer
     
+    def get_host(self, shape: Tuple[int, ...], dtype: Optional[torch.dtype] = None) -> torch.Tensor:
+        """Get a pinned host staging buffer (contents undefined)."""
+        if dtype is None:
+            dtype = self.dtype
+        
+        key = (shape, dtype)
+        
+        if key in self.host_buffers and self.host_buffers[key]:
+            return self.host_buffers[key].pop()
+        
+        # Pinned memory lets the GPU DMA from it asynchronously
+        return torch.empty(shape, dtype=dtype, pin_memory=self._copy_stream is not None)
+    
     def put(self, buffer: torch.Tensor):
-        """Return buffer to pool for reuse."""
+        """Return buffer (device or pinned host) to pool for reuse."""
         key = (tuple(buffer.shape), buffer.dtype)
+        pool = self.host_buffers if buffer.device.type == 'cpu' else self.buffers
         
-        if key not in self.buffers:
-            self.buffers[key] = []
+        if key not in pool:
+            pool[key] = []
         
-        if len(self.buffers[key]) < self.max_pool_size:
-            self.buffers[key].append(buffer)
+        if len(pool[key]) < self.max_pool_size:
+            pool[key].append(buffer)
+    
+    def async_to_device(self, host_buffer: torch.Tensor) -> torch.Tensor:
+        """Copy a host buffer into a pooled device buffer on a side stream.
+        
+        Later work on the current stream waits for the copy; the host buffer
+        must not be refilled until the current stream has passed this point.
+        """
+        if self._copy_stream is None:
+            return host_buffer.to(self.device)
+        
+        pooled = self.buffers.get((tuple(host_buffer.shape), host_buffer.dtype))
+        if pooled:
+            device_buffer = pooled.pop()
+        else:
+            device_buffer = torch.empty(host_buffer.shape, dtype=host_buffer.dtype, device=self.device)
+        
+        current = torch.cuda.current_stream(self.device)
+        self._copy_stream.wait_stream(current)  # device_buffer may still be in use
+        with torch.cuda.stream(self._copy_stream):
+            device_buffer.copy_(host_buffer, non_blocking=True)
+        current.wait_stream(self._copy_stream)
+        return device_buffer
     
     def clear(self):
         """Clear all buffers."""
         self.buffers.clear()
+        self.host_buffers.clear()
 
 
 # =============================================================================
@@ -201,15 +261,30 @@ class VoiceEmbeddingCache:
         self.cache_dir = cache_dir / "voice_embeddings"
         self.cache_dir.mkdir(exist_ok=True, parents=True)
         self._cache: Dict[str, Tuple[torch.Tensor, str]] = {}
+        # path -> (mtime_ns, size, hash): unchanged files are not re-read
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}
     
     def _compute_file_hash(self, audio_path: str) -> str:
-        """Compute SHA256 hash of audio file."""
-        hasher = hashlib.sha256()
+        """Compute BLAKE3 (if installed) or SHA256 hash of audio file."""
         try:
+            st = os.stat(audio_path)
+            memo = self._hashes.get(audio_path)
+            if memo is not None and memo[:2] == (st.st_mtime_ns, st.st_size):
+                return memo[2]
+            
             with open(audio_path, 'rb') as f:
-                for chunk in iter(lambda: f.read(8192), b''):
-                    hasher.update(chunk)
-            return hasher.hexdigest()
+                if blake3 is not None:
+                    file_hash = blake3(f.read()).hexdigest()
+                elif hasattr(hashlib, 'file_digest'):
+                    # Python 3.11+: the read/update loop runs in C
+                    file_hash = hashlib.file_digest(f, 'sha256').hexdigest()
+                else:
+                    hasher = hashlib.sha256()
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        hasher.update(chunk)
+                    file_hash = hasher.hexdigest()
+            self._hashes[audio_path] = (st.st_mtime_ns, st.st_size, file_hash)
+            return file_hash
         except Exception as e:
             print(f"[WARN] Failed to hash {audio_path}: {e}")
             return f"error_{time.time()}"
@@ -231,17 +306,14 @@ class VoiceEmbeddingCache:
             else:
                 del self._cache[cache_key]
         
-        # Disk cache
-        cache_file = self.cache_dir / f"{cache_key}.pkl"
+        # Disk cache: the tensor is read straight from the file, with the
+        # hash in the header so a stale entry is rejected before loading it
+        cache_file = self.cache_dir / f"{cache_key}.safetensors"
         if cache_file.exists():
             try:
-                with open(cache_file, 'rb') as f:
-                    data = pickle.load(f)
-                    if data['hash'] == file_hash:
-                        embedding = data['embedding']
-                        if not isinstance(embedding, torch.Tensor):
-                            embedding = torch.tensor(embedding)
-                        self._cache[cache_key] = (embedding, file_hash)
+                with safe_open(str(cache_file), framework='pt') as f:
+                    if (f.metadata() or {}).get('hash') == file_hash:
+                        embedding = self._remember(cache_key, f.get_tensor('embedding'), file_hash)
                         print(f"[DISK CACHE HIT] {os.path.basename(audio_path)}")
                         return embedding
             except Exception as e:
@@ -255,24 +327,32 @@ class VoiceEmbeddingCache:
         file_hash = self._compute_file_hash(audio_path)
         
         # Memory cache
-        self._cache[cache_key] = (embedding.detach().cpu(), file_hash)
+        embedding = self._remember(cache_key, embedding.detach().cpu().contiguous(), file_hash)
         
         # Disk cache
-        cache_file = self.cache_dir / f"{cache_key}.pkl"
+        cache_file = self.cache_dir / f"{cache_key}.safetensors"
         try:
-            with open(cache_file, 'wb') as f:
-                pickle.dump({
-                    'embedding': embedding.detach().cpu().numpy(),
-                    'hash': file_hash
-                }, f)
+            save_file({'embedding': embedding}, str(cache_file), metadata={'hash': file_hash})
             print(f"[CACHE SAVED] {os.path.basename(audio_path)}")
         except Exception as e:
             print(f"[WARN] Failed to save cache: {e}")
     
+    def _remember(self, cache_key: str, embedding: torch.Tensor, file_hash: str) -> torch.Tensor:
+        """Keep an embedding in the memory cache, pinned once when CUDA is available.
+        
+        Every later hit returns the same pinned tensor, so callers' copies to
+        the GPU with non_blocking=True are asynchronous without pinning per hit.
+        """
+        if torch.cuda.is_available():
+            embedding = embedding.pin_memory()
+        self._cache[cache_key] = (embedding, file_hash)
+        return embedding
+    
     def clear(self):
         """Clear all cached embeddings."""
         self._cache.clear()
-        for cache_file in self.cache_dir.glob("*.pkl"):
+        # *.pkl: entries written before the switch to safetensors
+        for cache_file in [*self.cache_dir.glob("*.safetensors"), *self.cache_dir.glob("*.pkl")]:
             try:
                 cache_file.unlink()
             except Exception as e:
@@ -339,7 +419,7 @@ class HybridPrecisionManager:
         if self.compute_dtype == torch.float32:
             yield
         else:
-            with autocast(dtype=self.compute_dtype, enabled=True):
+            with autocast('cuda', dtype=self.compute_dtype, enabled=True):
                 yield
 
 
@@ -362,7 +442,7 @@ class CUDAGraphManager:
         print(f"[CUDA GRAPH] Warming up for {iterations} iterations...")
         model.eval()
         
-        with torch.no_grad():
+        with torch.inference_mode():
             for i in range(iterations):
                 try:
                     _ = model(**example_inputs)
@@ -587,7 +667,7 @@ class TTSOptimizer:
         # Check cache
         cached = self.embedding_cache.get(audio_path, model_name)
         if cached is not None:
-            return cached.to(self.device)
+            return cached.to(self.device, non_blocking=True)
         
         # Generate new embedding
         print(f"[OPTIMIZER] Generating embedding for {os.path.basename(audio_path)}...")
@@ -9,7 +9,6 @@ extended to additional taskbar icons.
 
 from __future__ import annotations
 
-import base64
 import io
 from dataclasses import dataclass
 from typing import Optional, Tuple
@@ -19,6 +18,15 @@ from PIL import Image
 
 import cv2  # type: ignore
 
+try:
+    import pybase64 as base64  # SIMD-accelerated drop-in for the stdlib module
+except ImportError:
+    import base64
+
+
+# Template scales searched to accommodate DPI scaling/taskbar sizes
+_TEMPLATE_SCALES = (0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3, 1.5)
+
 
 @dataclass
 class DetectionResult:
@@ -66,14 +74,20 @@ class StartButtonDetector:
     # ------------------------------------------------------------------
     # Public API
     # ------------------------------------------------------------------
-    def detect_from_base64(self, image_b64: str) -> Optional[DetectionResult]:
-        image = _decode_base64_to_cv2(image_b64)
-        return self.detect(image)
+    def detect_from_base64(self, image_b64: str, scale: float = 1.0) -> Optional[DetectionResult]:
+        image = decode_base64_to_cv2(image_b64)
+        return self.detect(image, scale=scale)
 
-    def detect(self, image: np.ndarray) -> Optional[DetectionResult]:
+    def detect(self, image: np.ndarray, scale: float = 1.0) -> Optional[DetectionResult]:
+        """Detect the Start button.
+
+        ``scale`` is the ratio of image pixels to screen pixels, used when the
+        screenshot was downscaled before detection so the template search
+        covers the shrunken icon sizes.
+        """
         roi, roi_origin = self._extract_bottom_left_roi(image)
 
-        template_match = self._run_template_matching(roi)
+        template_match = self._run_template_matching(roi, scale)
         if not template_match:
             return None
 
@@ -133,12 +147,12 @@ class StartButtonDetector:
         height: float
         confidence: float
 
-    def _run_template_matching(self, roi: np.ndarray) -> Optional["StartButtonDetector._TemplateMatch"]:
+    def _run_template_matching(self, roi: np.ndarray, image_scale: float = 1.0) -> Optional["StartButtonDetector._TemplateMatch"]:
         """Find Start button using template matching across multiple scales."""
         roi_gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
 
         # Explore multiple scales to accommodate DPI scaling/taskbar sizes
-        scales = [0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3, 1.5]
+        scales = [s * image_scale for s in _TEMPLATE_SCALES]
         best_match: Optional[StartButtonDetector._TemplateMatch] = None
 
         for scale in scales:
@@ -397,13 +411,18 @@ class GenericUIDetector:
         except Exception:
             return None
     
-    def detect(self, image: np.ndarray) -> Optional[DetectionResult]:
-        """Detect the UI element in the given screenshot."""
+    def detect(self, image: np.ndarray, scale: float = 1.0) -> Optional[DetectionResult]:
+        """Detect the UI element in the given screenshot.
+        
+        Args:
+            image: BGR screenshot
+            scale: Ratio of image pixels to screen pixels (for downscaled screenshots)
+        """
         # Extract ROI based on region setting
         roi, roi_origin = self._extract_roi(image)
         
         # Run multi-scale template matching
-        match_result = self._run_template_matching(roi)
+        match_result = self._run_template_matching(roi, scale)
         
         if match_result is None:
             return None
@@ -422,10 +441,10 @@ class GenericUIDetector:
             method="opencv_template_matching"
         )
     
-    def detect_from_base64(self, image_b64: str) -> Optional[DetectionResult]:
+    def detect_from_base64(self, image_b64: str, scale: float = 1.0) -> Optional[DetectionResult]:
         """Detect from base64-encoded image."""
-        np_img = _decode_base64_to_cv2(image_b64)
-        return self.detect(np_img)
+        np_img = decode_base64_to_cv2(image_b64)
+        return self.detect(np_img, scale=scale)
     
     def _extract_roi(self, image: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int]]:
         """Extract region of interest based on roi_region setting."""
@@ -447,7 +466,7 @@ class GenericUIDetector:
         else:  # "full"
             return image, (0, 0)
     
-    def _run_template_matching(self, roi: np.ndarray) -> Optional[dict]:
+    def _run_template_matching(self, roi: np.ndarray, image_scale: float = 1.0) -> Optional[dict]:
         """Run multi-scale template matching."""
         roi_gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
         
@@ -455,7 +474,7 @@ class GenericUIDetector:
         best_confidence = 0.0
         
         # Multi-scale search
-        scales = [0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3, 1.5]
+        scales = [s * image_scale for s in _TEMPLATE_SCALES]
         methods = [cv2.TM_CCOEFF_NORMED, cv2.TM_CCORR_NORMED]
         
         for scale in scales:
@@ -498,10 +517,24 @@ class GenericUIDetector:
 # Utility functions
 # ----------------------------------------------------------------------
 
-def _decode_base64_to_cv2(image_b64: str) -> np.ndarray:
+def decode_base64_to_cv2(image_b64: str) -> np.ndarray:
+    """Decode a base64 JPEG/PNG screenshot straight to a BGR array.
+
+    Decode once per frame and pass the array to ``detect()`` when several
+    detectors run on the same screenshot.
+    """
     data = base64.b64decode(image_b64)
-    pil_image = Image.open(io.BytesIO(data)).convert("RGB")
-    return cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        # Fall back to PIL for formats OpenCV cannot decode
+        pil_image = Image.open(io.BytesIO(data)).convert("RGB")
+        image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+    return image
+
+
+def pil_to_cv2(image: Image.Image) -> np.ndarray:
+    """Convert a PIL screenshot to a BGR array without an encode/decode round trip."""
+    return cv2.cvtColor(np.asarray(image.convert("RGB")), cv2.COLOR_RGB2BGR)
 
 
 def _crop_with_margin(
@@ -523,4 +556,4 @@ def _crop_with_margin(
     return image[y1:y2, x1:x2]
 
 
-__all__ = ["StartButtonDetector", "GenericUIDetector", "DetectionResult"]
+__all__ = ["StartButtonDetector", "GenericUIDetector", "DetectionResult", "decode_base64_to_cv2", "pil_to_cv2"]
@@ -4,6 +4,7 @@ Zeyta AI Web Application - Fully Self-Contained
 Local web interface for TTS, STT, and LLM models with automatic dependency management
 """
 
+import atexit
 import json
 import os
 import shutil
@@ -640,7 +641,7 @@ def ensure_dependencies():
 ensure_dependencies()
 
 # Now import all required packages
-from flask import Flask, render_template, request, jsonify, send_file, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify, send_file, send_from_directory, stream_with_context
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 from werkzeug.utils import secure_filename
@@ -2207,6 +2208,16 @@ def api_llm_models():
 
 # Initialize agent
 from agent import AgentMode
+
+try:
+    import orjson  # Optional: faster encoding of streamed chat events
+
+    def _sse_event(event) -> bytes:
+        return b"data: " + orjson.dumps(event) + b"\n\n"
+except ImportError:
+    def _sse_event(event) -> bytes:
+        return f"data: {json.dumps(event)}\n\n".encode("utf-8")
+
 agent = None
 
 @app.route('/api/agent/status')
@@ -2241,6 +2252,8 @@ def api_agent_initialize():
     try:
         if agent is None:
             agent = AgentMode(BASE_DIR)
+            # Tasks keep the model loaded between runs; free it when the app exits
+            atexit.register(agent.shutdown)
         
         ollama_status = agent.check_ollama_status()
         
@@ -2285,6 +2298,27 @@ def api_agent_chat():
     result = agent.chat(message, include_screen)
     return jsonify(result)
 
+@app.route('/api/agent/chat/stream', methods=['POST'])
+def api_agent_chat_stream():
+    """Chat with agent, streaming tokens as server-sent events"""
+    global agent
+    if agent is None:
+        return jsonify({'success': False, 'message': 'Agent not initialized'})
+    
+    data = request.get_json(silent=True) or {}
+    message = data.get('message', '')
+    include_screen = data.get('include_screen', False)
+    
+    def event_stream():
+        for event in agent.chat_stream(message, include_screen):
+            yield _sse_event(event)
+    
+    return Response(
+        stream_with_context(event_stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/agent/analyze-screen', methods=['POST'])
 def api_agent_analyze_screen():
     """Analyze current screen"""
@@ -2350,12 +2384,13 @@ def api_agent_clear_history():
 
 @app.route('/api/agent/cancel', methods=['POST'])
 def api_agent_cancel():
-    """Emergency stop - cancel current operation and unload model"""
+    """Emergency stop - cancel current operation (optionally unloading models)"""
     global agent
     if agent is None:
         return jsonify({'success': False, 'message': 'Agent not initialized'})
     
-    result = agent.cancel_operation()
+    data = request.get_json(silent=True) or {}
+    result = agent.cancel_operation(unload_models=bool(data.get('unload_models', False)))
     return jsonify(result)
 
 @app.route('/api/history/files')
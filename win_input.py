@@ -0,0 +1,129 @@
+"""win_input
+===========
+
+Batched synthetic keyboard input for Windows via ``user32.SendInput``.
+
+PyAutoGUI issues one ``SendInput`` per key event and sleeps between
+characters. Packing a whole string or hotkey chord into a single INPUT
+array delivers it in one call, so it is queued atomically and cannot be
+interleaved with other input. On non-Windows platforms ``SUPPORTED`` is
+False and callers should fall back to PyAutoGUI.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import sys
+from typing import List, Optional
+
+SUPPORTED = sys.platform == "win32"
+
+INPUT_KEYBOARD = 1
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_UNICODE = 0x0004
+
+VK_RETURN = 0x0D
+VK_TAB = 0x09
+
+# PyAutoGUI key names -> Windows virtual-key codes for hotkey chords
+_VK_CODES = {
+    "ctrl": 0x11, "ctrlleft": 0xA2, "ctrlright": 0xA3,
+    "shift": 0x10, "shiftleft": 0xA0, "shiftright": 0xA1,
+    "alt": 0x12, "altleft": 0xA4, "altright": 0xA5,
+    "win": 0x5B, "winleft": 0x5B, "winright": 0x5C,
+    "enter": VK_RETURN, "return": VK_RETURN, "tab": VK_TAB,
+    "esc": 0x1B, "escape": 0x1B, "space": 0x20, "backspace": 0x08,
+    "delete": 0x2E, "del": 0x2E, "insert": 0x2D, "home": 0x24, "end": 0x23,
+    "pageup": 0x21, "pgup": 0x21, "pagedown": 0x22, "pgdn": 0x22,
+    "left": 0x25, "up": 0x26, "right": 0x27, "down": 0x28,
+}
+_VK_CODES.update({f"f{i}": 0x6F + i for i in range(1, 13)})
+_VK_CODES.update({c: ord(c.upper()) for c in "abcdefghijklmnopqrstuvwxyz0123456789"})
+
+
+class _KEYBDINPUT(ctypes.Structure):
+    _fields_ = [
+        ("wVk", ctypes.c_ushort),
+        ("wScan", ctypes.c_ushort),
+        ("dwFlags", ctypes.c_ulong),
+        ("time", ctypes.c_ulong),
+        ("dwExtraInfo", ctypes.c_size_t),
+    ]
+
+
+class _MOUSEINPUT(ctypes.Structure):
+    # Only present so the union has the size SendInput expects
+    _fields_ = [
+        ("dx", ctypes.c_long),
+        ("dy", ctypes.c_long),
+        ("mouseData", ctypes.c_ulong),
+        ("dwFlags", ctypes.c_ulong),
+        ("time", ctypes.c_ulong),
+        ("dwExtraInfo", ctypes.c_size_t),
+    ]
+
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [("ki", _KEYBDINPUT), ("mi", _MOUSEINPUT)]
+
+
+class _INPUT(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_ulong), ("union", _INPUTUNION)]
+
+
+def _key_event(vk: int = 0, scan: int = 0, flags: int = 0) -> _INPUT:
+    event = _INPUT(type=INPUT_KEYBOARD)
+    event.union.ki = _KEYBDINPUT(wVk=vk, wScan=scan, dwFlags=flags, time=0, dwExtraInfo=0)
+    return event
+
+
+def _send(events: List[_INPUT]) -> None:
+    """Deliver all events with a single SendInput call."""
+    if not events:
+        return
+    array = (_INPUT * len(events))(*events)
+    sent = ctypes.windll.user32.SendInput(len(events), array, ctypes.sizeof(_INPUT))
+    if sent != len(events):
+        raise OSError(f"SendInput delivered {sent}/{len(events)} events")
+
+
+def send_text(text: str) -> None:
+    """Type ``text`` as one batch of Unicode key events.
+
+    Newlines and tabs are sent as real Enter/Tab keys because most
+    applications ignore them as Unicode characters.
+    """
+    events: List[_INPUT] = []
+    for char in text:
+        if char in "\r\n\t":
+            if char == "\r":
+                continue
+            vk = VK_RETURN if char == "\n" else VK_TAB
+            events.append(_key_event(vk=vk))
+            events.append(_key_event(vk=vk, flags=KEYEVENTF_KEYUP))
+            continue
+        # Characters outside the BMP are sent as UTF-16 surrogate pairs
+        units = char.encode("utf-16-le")
+        for i in range(0, len(units), 2):
+            code = int.from_bytes(units[i:i + 2], "little")
+            events.append(_key_event(scan=code, flags=KEYEVENTF_UNICODE))
+            events.append(_key_event(scan=code, flags=KEYEVENTF_UNICODE | KEYEVENTF_KEYUP))
+    _send(events)
+
+
+def send_hotkey(*keys: str) -> bool:
+    """Press ``keys`` in order and release them in reverse, in one call.
+
+    Returns False without sending anything if a key has no known
+    virtual-key code, so the caller can fall back to PyAutoGUI.
+    """
+    codes: List[Optional[int]] = [_VK_CODES.get(key.lower()) for key in keys]
+    if not codes or None in codes:
+        return False
+    events = [_key_event(vk=code) for code in codes]
+    events += [_key_event(vk=code, flags=KEYEVENTF_KEYUP) for code in reversed(codes)]
+    _send(events)
+    return True
+
+
+__all__ = ["SUPPORTED", "send_text", "send_hotkey"]